@@ -1,10 +1,9 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-import psutil
 import json
 import time
 from datetime import datetime
@@ -12,9 +11,20 @@ from pathlib import Path
 from model import get_llama_model
 from memory import (
     retrieve_memories, load_memory, TOP_K_MEMORY, get_latest_notes, 
-    search_notes_by_title, sync_obsidian_memory, memory_texts
+    search_notes_by_title, sync_obsidian_memory, memory_texts, last_sync_report,
+    get_query_cache_stats, personal_seed_chunks
 )
-from logic import build_prompt
+import memory
+import metrics
+from logic import build_prompt, plan_context, make_token_counter, RESERVED_OUTPUT_TOKENS
+from vault_watcher import start_vault_sync
+from inference import InferenceScheduler, QueueFullError, load_slots, process_rss_mb
+from sessions import SessionStore
+from startup import ComponentLoader
+from system_monitor import SystemMonitor
+import threading
+import asyncio
+import functools
 
 
 app = FastAPI(title="Shendu AI API", description="Enhanced AI API with Obsidian Integration")
@@ -39,15 +49,72 @@ static_dir.mkdir(exist_ok=True)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
-# Initialize model and memory
-llm = get_llama_model()
-load_memory()
+# Model and memory load in the background after startup (see startup.py)
+count_tokens = None
+inference_scheduler = None
+loader = ComponentLoader()
+session_store = SessionStore()
+system_monitor = SystemMonitor()
+SYNC_INTERVAL = 300  # Polling fallback when file events are unavailable
+READY_WAIT_SECONDS = 10  # how long a request waits for a loading component before its 503
+CHAT_COMPONENTS = ("model", "embedder", "memory")
+sync_state = {"mode": None}
+
+
+def load_model():
+    """Load the first inference slot; more are added in the background as RAM and cores allow"""
+    global count_tokens, inference_scheduler
+    rss_before = process_rss_mb()
+    model = get_llama_model()
+    slot_mb = process_rss_mb() - rss_before
+    count_tokens = make_token_counter(model)
+    inference_scheduler = InferenceScheduler(model)
+    threading.Thread(target=load_slots, args=(inference_scheduler, get_llama_model, slot_mb), daemon=True).start()
+
+
+def start_background_sync():
+    """Catch up on changes made while the server was down, then follow the vault"""
+    if not loader.wait(("memory",)):
+        print("⚠️  Memory failed to load - Obsidian sync disabled")
+        return
+    try:
+        sync_obsidian_memory()
+    except Exception as e:
+        print(f"Initial Obsidian sync error: {e}")
+    sync_state["mode"] = start_vault_sync(SYNC_INTERVAL)
+
+
+@app.on_event("startup")
+async def startup_load():
+    system_monitor.start()
+    loader.start("model", load_model)
+    loader.start("embedder", memory.get_embedder)
+    loader.start("memory", load_memory)
+    threading.Thread(target=start_background_sync, daemon=True).start()
+
+
+def require_ready(names, timeout=READY_WAIT_SECONDS):
+    """Wait up to timeout for the named components; 503 while they are loading or if they failed"""
+    if not loader.wait(names, timeout):
+        raise HTTPException(status_code=503, detail=f"Not ready: {loader.not_ready(names)}",
+                            headers={"Retry-After": "5"})
+
+
+async def wait_ready(names, timeout=READY_WAIT_SECONDS):
+    """require_ready for async endpoints, waiting off the event loop"""
+    if not loader.is_ready(*names):
+        await asyncio.get_running_loop().run_in_executor(None, require_ready, names, timeout)
+
+
+def chat_components(req):
+    return CHAT_COMPONENTS if req.use_memory else ("model",)
 
 
 class ChatRequest(BaseModel):
-    history: list
+    history: list = []  # ignored once session_id names an existing server-side session
     user_input: str
     use_memory: bool = True
+    session_id: Optional[str] = None
 
 
 class SystemStats(BaseModel):
@@ -55,72 +122,327 @@ class SystemStats(BaseModel):
     memory_percent: float
     disk_percent: float
     network_io: Dict[str, int]
+    network_rate: Optional[Dict[str, float]] = None  # bytes per second since the previous sample
     temperature: Optional[float] = None
     timestamp: str
 
 
+def prepare_prompt(history, user_input, use_memory):
+    """Retrieve memories, fit them and the history into the context window and build the prompt.
+
+    Returns (prompt, memories, plan, retrieval timings, prompt build ms). Messages
+    that no longer fit are dropped from the front of history, so session histories
+    stay within budget.
+    """
+    personal_memories = []
+    pinned_memories = []
+    timings = {}
+    if use_memory:
+        personal_memories = retrieve_memories(user_input, TOP_K_MEMORY, timings)
+        pinned_memories = personal_seed_chunks()
+    build_start = time.perf_counter()
+    kept_history, personal_memories, plan = plan_context(
+        history, user_input, personal_memories, count_tokens, pinned_memories=pinned_memories
+    )
+    if plan["messages_dropped"]:
+        del history[:plan["messages_dropped"]]
+    prompt = build_prompt(kept_history, user_input, personal_memories, pinned_memories)
+    prompt_build_ms = round((time.perf_counter() - build_start) * 1000, 3)
+    return prompt, personal_memories, plan, timings, prompt_build_ms
+
+
+def memory_scores(personal_memories):
+    """Source and similarity of each memory that made it into the prompt"""
+    return [{"source": m.source, "score": m.score} for m in personal_memories]
+
+
+def record_turn(session, user_input, reply):
+    """Append a finished turn to the server-side session history"""
+    if session is not None:
+        session.history.append({"role": "user", "content": user_input})
+        session.history.append({"role": "assistant", "content": reply})
+
+
+def session_turn(func):
+    """Run one turn of a session at a time, whichever slots its requests land on"""
+    @functools.wraps(func)
+    def wrapper(llm, session, *args, **kwargs):
+        if session is None:
+            return func(llm, session, *args, **kwargs)
+        with session.lock:
+            return func(llm, session, *args, **kwargs)
+    return wrapper
+
+
+def run_completion(llm, session, prompt, start_time, emit=None, cancelled=None):
+    """Restore the session's KV state and stream the reply, timing each stage.
+
+    Tokens are passed to emit() as they arrive; generation stops early once
+    cancelled is set. Returns (reply, completion tokens, prompt reuse stats, timings
+    in ms since start_time), or None if cancelled stopped the turn - before the
+    prompt was evaluated or part way through the reply, which is then discarded
+    and not checkpointed into the session.
+    """
+    if cancelled is not None and cancelled.is_set():
+        return None
+    timings = {}
+    restore_start = time.perf_counter()
+    context_before = session_store.restore(llm, session)
+    eval_start = time.perf_counter()
+    timings["state_restore_ms"] = round((eval_start - restore_start) * 1000, 1)
+    if cancelled is not None and cancelled.is_set():
+        return None
+    stream = llm.create_chat_completion(
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=RESERVED_OUTPUT_TOKENS,
+        temperature=0.2,
+        top_p=0.95,
+        stream=True
+    )
+    
+    reply = ""
+    tokens = 0
+    first_token_time = None
+    for chunk in stream:
+        if cancelled is not None and cancelled.is_set():
+            return None
+        text = chunk["choices"][0]["delta"].get("content", "")
+        if not text:
+            continue
+        if first_token_time is None:
+            first_token_time = time.perf_counter()
+        tokens += 1
+        reply += text
+        if emit is not None:
+            emit({"type": "token", "content": text})
+    
+    end_time = time.perf_counter()
+    generation_time = end_time - (first_token_time or end_time)
+    # Streaming chunks carry no usage block; the context holds prompt + generated tokens
+    reuse = session_store.checkpoint(llm, session, context_before, llm.n_tokens - tokens)
+    timings.update({
+        "prompt_eval_ms": round(((first_token_time or end_time) - eval_start) * 1000, 1),
+        "ttft_ms": round((first_token_time - start_time) * 1000, 1) if first_token_time else None,
+        "generation_ms": round(generation_time * 1000, 1),
+        "tokens_per_sec": round((tokens - 1) / generation_time, 2) if tokens > 1 and generation_time > 0 else None,
+        "total_ms": round((end_time - start_time) * 1000, 1)
+    })
+    return reply, tokens, reuse, timings
+
+
+@session_turn
+def generate_reply(llm, session, history, user_input, use_memory):
+    """Retrieve memories and run the model - called on an inference slot thread"""
+    start_time = time.perf_counter()
+    if session is not None:
+        history = session.history
+    prompt, personal_memories, plan, retrieval, prompt_build_ms = prepare_prompt(history, user_input, use_memory)
+    reply, tokens, reuse, timings = run_completion(llm, session, prompt, start_time)
+    timings["prompt_build_ms"] = prompt_build_ms
+    record_turn(session, user_input, reply)
+    metrics.record_chat("chat", timings, retrieval, dict(reuse, completion_tokens=tokens))
+    return dict(reuse, reply=reply, memories_used=len(personal_memories),
+                memory_scores=memory_scores(personal_memories), context=plan, retrieval_ms=retrieval,
+                completion_tokens=tokens, timings=timings)
+
+
+@session_turn
+def stream_reply(llm, session, history, user_input, use_memory, emit, cancelled):
+    """Generate with stream=True, passing each event to emit() - runs on an inference slot thread.
+
+    Stops early when the client went away (cancelled is set), skipping
+    retrieval and prompt evaluation if it left while the request was queued.
+    """
+    try:
+        if cancelled.is_set():
+            metrics.registry.increment("chat_requests_total", endpoint="stream", outcome="cancelled")
+            return {"cancelled": True}
+        start_time = time.perf_counter()
+        if session is not None:
+            history = session.history
+        prompt, personal_memories, plan, retrieval, prompt_build_ms = prepare_prompt(history, user_input, use_memory)
+        emit({"type": "meta", "memories_used": len(personal_memories), "memory_scores": memory_scores(personal_memories),
+              "context": plan, "retrieval_ms": retrieval})
+        
+        completion = run_completion(llm, session, prompt, start_time, emit, cancelled)
+        if completion is None:
+            metrics.registry.increment("chat_requests_total", endpoint="stream", outcome="cancelled")
+            return {"cancelled": True}
+        reply, tokens, reuse, timings = completion
+        timings["prompt_build_ms"] = prompt_build_ms
+        record_turn(session, user_input, reply)
+        metrics.record_chat("stream", timings, retrieval, dict(reuse, completion_tokens=tokens))
+        stats = {
+            "ttft_ms": timings["ttft_ms"],
+            "tokens": tokens,
+            "tokens_per_sec": timings["tokens_per_sec"],
+            "total_ms": timings["total_ms"],
+            "timings": timings
+        }
+        stats.update(reuse)
+        emit(dict(stats, type="done", memories_used=len(personal_memories)))
+        return dict(stats, reply=reply, memories_used=len(personal_memories), completion_tokens=tokens)
+    except Exception as e:
+        metrics.registry.increment("chat_requests_total", endpoint="stream", outcome="error")
+        emit({"type": "error", "detail": str(e)})
+        raise
+
+
+def get_session(req):
+    """Server-side session for the request, or None for stateless requests"""
+    if not req.session_id:
+        return None
+    try:
+        return session_store.get(req.session_id, req.history)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 # Enhanced chat endpoint with better error handling
 @app.post("/chat")
 async def chat_endpoint(req: ChatRequest):
     try:
         print(f"Received chat request: {req.user_input}")
-        personal_memories = []
-        if req.use_memory:
-            personal_memories = retrieve_memories(req.user_input, TOP_K_MEMORY)
-        prompt = build_prompt(req.history, req.user_input, personal_memories)
-        stream = llm.create_chat_completion(
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=1024,
-            temperature=0.2,
-            top_p=0.95,
-            stream=False
-        )
-        reply = stream["choices"][0]["message"]["content"]
-        print(f"Generated reply: {reply[:100]}...")
+        await wait_ready(chat_components(req))
+        session = get_session(req)
+        try:
+            future = inference_scheduler.submit(generate_reply, session, req.history, req.user_input, req.use_memory)
+        except QueueFullError as e:
+            metrics.registry.increment("chat_requests_total", endpoint="chat", outcome="rejected")
+            raise HTTPException(status_code=503, detail=f"Server busy: {e}", headers={"Retry-After": "5"})
+        result = await asyncio.wrap_future(future)
+        print(f"Generated reply: {result['reply'][:100]}...")
         return {
-            "reply": reply,
-            "memories_used": len(personal_memories),
+            "reply": result["reply"],
+            "memories_used": result["memories_used"],
+            "memory_scores": result["memory_scores"],
+            "session_id": req.session_id,
+            "prompt_tokens": result["prompt_tokens"],
+            "prompt_tokens_reused": result["prompt_tokens_reused"],
+            "prompt_tokens_evaluated": result["prompt_tokens_evaluated"],
+            "prefix_reuse_ratio": result["prefix_reuse_ratio"],
+            "context": result["context"],
+            "retrieval_ms": result["retrieval_ms"],
+            "timings": dict(result["timings"], queue_wait_ms=result["queue_wait_ms"]),
+            "queue_wait_ms": result["queue_wait_ms"],
+            "queue_depth": inference_scheduler.jobs.qsize(),
+            "slot": result["slot"],
             "timestamp": datetime.now().isoformat()
         }
+    except HTTPException:
+        raise
     except Exception as e:
+        metrics.registry.increment("chat_requests_total", endpoint="chat", outcome="error")
         print(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-# System stats endpoint
+# Streaming chat: newline-delimited JSON events (meta, token..., done | error)
+@app.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest):
+    print(f"Received streaming chat request: {req.user_input}")
+    await wait_ready(chat_components(req))
+    session = get_session(req)
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    cancelled = threading.Event()
+    submitted = time.time()
+    
+    def emit(event):
+        if event["type"] == "meta":
+            event["queue_wait_ms"] = round((time.time() - submitted) * 1000, 1)
+            event["session_id"] = req.session_id
+        loop.call_soon_threadsafe(events.put_nowait, event)
+    
+    try:
+        inference_scheduler.submit(stream_reply, session, req.history, req.user_input, req.use_memory, emit, cancelled)
+    except QueueFullError as e:
+        metrics.registry.increment("chat_requests_total", endpoint="stream", outcome="rejected")
+        raise HTTPException(status_code=503, detail=f"Server busy: {e}", headers={"Retry-After": "5"})
+    
+    async def event_stream():
+        try:
+            while True:
+                event = await events.get()
+                yield json.dumps(event) + "\n"
+                if event["type"] in ("done", "error"):
+                    break
+        finally:
+            # Client disconnected or stream finished - stop generating either way
+            cancelled.set()
+    
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    session_store.reset(session_id)
+    return {"session_id": session_id, "deleted": True}
+
+
+@app.get("/ready")
+async def get_readiness():
+    """Load state and load time of each component; 503 until all are ready"""
+    status = loader.get_status()
+    return JSONResponse(status_code=200 if status["ready"] else 503,
+                        content=dict(status, timestamp=datetime.now().isoformat()))
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Stage latency histograms, token counters and slot gauges in the Prometheus text format"""
+    if inference_scheduler is not None:
+        stats = inference_scheduler.get_stats()
+        metrics.registry.set_gauge("queue_depth", stats["queue_depth"])
+        metrics.registry.set_gauge("busy_slots", stats["busy_slots"])
+        metrics.registry.set_gauge("inference_slots", len(stats["slots"]))
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/session-stats")
+async def get_session_stats():
+    return dict(session_store.get_stats(), timestamp=datetime.now().isoformat())
+
+
+@app.get("/queue-stats")
+async def get_queue_stats():
+    await wait_ready(("model",), timeout=0)
+    return dict(inference_scheduler.get_stats(), timestamp=datetime.now().isoformat())
+
+
+# System stats endpoints - served from the background sampler, never sampled per request
 @app.get("/system-stats")
 async def get_system_stats():
     try:
-        cpu_percent = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        network = psutil.net_io_counters()
-        temp = None
-        try:
-            if hasattr(psutil, "sensors_temperatures"):
-                temps = psutil.sensors_temperatures()
-                if temps:
-                    temp = list(temps.values())[0][0].current
-        except:
-            pass
+        sample = system_monitor.latest()
         return SystemStats(
-            cpu_percent=cpu_percent,
-            memory_percent=memory.percent,
-            disk_percent=disk.percent,
-            network_io={
-                "bytes_sent": network.bytes_sent,
-                "bytes_recv": network.bytes_recv
-            },
-            temperature=temp,
-            timestamp=datetime.now().isoformat()
+            cpu_percent=sample["cpu_percent"],
+            memory_percent=sample["memory_percent"],
+            disk_percent=sample["disk_percent"],
+            network_io=sample["network_io"],
+            network_rate=sample["network_rate"],
+            temperature=sample["temperature"],
+            timestamp=sample["timestamp"]
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/system-stats/history")
+async def get_system_stats_history(seconds: Optional[float] = None):
+    """Buffered samples, oldest first; seconds limits them to the most recent window"""
+    samples = system_monitor.history(seconds)
+    return {
+        "interval_s": system_monitor.interval,
+        "samples": samples,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
 # Obsidian operations
 @app.get("/latest-notes")
 async def get_latest_notes_endpoint():
+    await wait_ready(("memory",))
     try:
         print("Getting latest notes...")
         notes = get_latest_notes(10)
@@ -132,14 +454,32 @@ async def get_latest_notes_endpoint():
 
 
 @app.post("/sync-obsidian")
-async def sync_obsidian_endpoint():
+def sync_obsidian_endpoint():
+    require_ready(("memory",))
     try:
         chunks_added = sync_obsidian_memory()
-        return {"chunks_added": chunks_added, "timestamp": datetime.now().isoformat()}
+        return {
+            "chunks_added": chunks_added,
+            "report": dict(last_sync_report),
+            "sync_mode": sync_state["mode"],
+            "timestamp": datetime.now().isoformat()
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/memory-stats")
+async def get_memory_stats():
+    return {
+        "chunks": len(memory.memory_texts),
+        "index_backend": memory.vector_index.ann_backend_name(memory.ann_index),
+        "vector_storage": memory.vector_index.storage_name(memory.index),
+        "vector_index_mb": round(memory.vector_index.storage_bytes_per_vector(memory.index) * memory.index.ntotal / (1024 * 1024), 2),
+        "query_cache": get_query_cache_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+
 # Add favicon endpoint to prevent 404 errors
 @app.get("/favicon.ico")
 async def get_favicon():
@@ -678,7 +1018,9 @@ async def serve_frontend():
         const sendButtonText = document.getElementById('sendButtonText');
         const memoryCounter = document.getElementById('memoryCount');
         
-        let conversationHistory = [];
+        // The server keeps the conversation (and the model's KV cache) per session
+        const sessionId = (window.crypto && crypto.randomUUID) ?
+            crypto.randomUUID() : `s-${Date.now()}-${Math.random().toString(16).slice(2)}`;
         let isProcessing = false;
         let totalMemoriesUsed = 0;
 
@@ -707,30 +1049,68 @@ async def serve_frontend():
             }
             
             const typingId = addTypingIndicator();
+            const sentAt = performance.now();
+            let reply = '';
+            let bubble = null;
+            let metaDiv = null;
+            let memoriesUsed = 0;
+            let clientTtft = null;
+
+            function handleEvent(event) {
+                if (event.type === 'meta') {
+                    memoriesUsed = event.memories_used;
+                } else if (event.type === 'token') {
+                    if (!bubble) {
+                        clientTtft = performance.now() - sentAt;
+                        removeTypingIndicator(typingId);
+                        const messageDiv = document.getElementById(addMessage('assistant', '', memoriesUsed));
+                        bubble = messageDiv.querySelector('.message-bubble');
+                        metaDiv = messageDiv.querySelector('.message-meta');
+                    }
+                    reply += event.content;
+                    bubble.textContent = `Shendu: ${reply}`;
+                    messagesContainer.scrollTop = messagesContainer.scrollHeight;
+                } else if (event.type === 'done') {
+                    if (metaDiv) {
+                        const stats = [`TTFT ${Math.round(clientTtft)} ms`];
+                        if (event.tokens_per_sec) stats.push(`${event.tokens_per_sec} tok/s`);
+                        if (event.prompt_tokens) stats.push(`${event.prompt_tokens_reused}/${event.prompt_tokens} prompt tokens cached`);
+                        metaDiv.textContent += ` • ${stats.join(' • ')}`;
+                    }
+                } else if (event.type === 'error') {
+                    throw new Error(event.detail);
+                }
+            }
 
-
-            fetch('/chat', {
+            fetch('/chat/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
-                    history: conversationHistory,
+                    session_id: sessionId,
                     user_input: message,
                     use_memory: true
                 })
             })
-            .then(response => {
+            .then(async response => {
                 if (!response.ok) throw new Error('Network error');
-                return response.json();
-            })
-            .then(data => {
-                removeTypingIndicator(typingId);
-                addMessage('assistant', `Shendu: ${data.reply}`, data.memories_used);
-                
-                conversationHistory.push({ role: 'user', content: message });
-                conversationHistory.push({ role: 'assistant', content: data.reply });
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffered = '';
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    buffered += decoder.decode(value, { stream: true });
+                    const lines = buffered.split('\\n');
+                    buffered = lines.pop();
+                    lines.filter(line => line.trim()).forEach(line => handleEvent(JSON.parse(line)));
+                }
+                if (!bubble) {
+                    removeTypingIndicator(typingId);
+                    addMessage('assistant', 'Shendu: ', memoriesUsed);
+                }
                 
-                if (data.memories_used) {
-                    totalMemoriesUsed += data.memories_used;
+                if (memoriesUsed) {
+                    totalMemoriesUsed += memoriesUsed;
                     updateMemoryCounter();
                 }
             })
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Reproducible performance benchmark for Shendu's memory pipeline.
+
+Builds a synthetic Obsidian vault (seeded, so every run sees the same notes)
+in a temporary directory and measures, for each vault size:
+
+  ingest_cold         update_obsidian_memory() over the whole vault
+  ingest_incremental  a sync after editing, adding and deleting a share of notes
+  ingest_idle         a sync with nothing changed (stat-only scan)
+  save / load         save_memory() and load_memory() time, store file sizes
+  retrieval           retrieve_memories() latency percentiles, uncached and cached
+  title_search        search_notes_by_title() latency percentiles
+  prompt_build        plan_context() + build_prompt() latency percentiles
+  generation          time to first token and tokens/sec (real model only)
+
+By default the sentence embedder is replaced with a hashed bag-of-words
+stub and prompts are budgeted with the character estimate, so the suite
+runs on a CPU-only box with no model download; --embedder real and --llm
+real measure the actual models. Results are written as JSON; --compare
+prints the ratio of every timing against an earlier result file.
+
+    python benchmark.py --notes 1000 10000 --output bench.json
+    python benchmark.py --notes 1000 --compare bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+RESULT_FORMAT_VERSION = 1
+DEFAULT_NOTE_COUNTS = [1000]
+TOPICS = 60  # synthetic topics; each note draws most of its words from one
+TOPIC_WORDS = 40
+COMMON_WORDS = ("the model data result paper method approach system work training evaluation baseline "
+                "experiment analysis performance task dataset layer error score test idea plan review").split()
+NOTES_PER_FOLDER = 200
+SENTENCES_PER_NOTE = (6, 18)
+WORDS_PER_SENTENCE = (8, 18)
+
+
+class HashEmbedder:
+    """Stand-in for SentenceTransformer: hashed bag-of-words vectors.
+
+    Texts sharing words get similar vectors, so retrieval still returns
+    sensible neighbours, at a fraction of the transformer's cost.
+    """
+
+    def __init__(self, dim):
+        self.dim = dim
+        self.slots = {}  # word -> (dimension, sign)
+
+    def slot(self, word):
+        slot = self.slots.get(word)
+        if slot is None:
+            h = zlib.crc32(word.encode("utf-8"))
+            slot = self.slots[word] = (h % self.dim, 1.0 if h & (1 << 31) else -1.0)
+        return slot
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True, show_progress_bar=False):
+        vectors = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                dim, sign = self.slot(word)
+                vectors[row, dim] += sign
+        return vectors
+
+
+def regex_sent_tokenize(text):
+    """Sentence splitter used when punkt data is not installed"""
+    return [s for s in re.split(r"(?<=[.!?])\s+", text) if s]
+
+
+def pseudo_word(rng):
+    syllables = ["ka", "ro", "mi", "tel", "san", "vor", "lu", "qen", "dra", "pi", "zen", "mo", "fa", "gri", "tos"]
+    return "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+
+
+def make_vocabulary(seed):
+    rng = random.Random(seed)
+    return [[pseudo_word(rng) for _ in range(TOPIC_WORDS)] for _ in range(TOPICS)]
+
+
+def note_text(rng, topics, n, sentences=None):
+    """Frontmatter, a heading and body sentences for note n"""
+    topic = n % len(topics)
+    words = topics[topic]
+    lines = ["---", f"title: {words[0].title()} {words[n % TOPIC_WORDS]} {n}", f"tags: [topic{topic}]", "---",
+             f"# {words[0].title()} notes", ""]
+    for _ in range(sentences or rng.randint(*SENTENCES_PER_NOTE)):
+        sentence = [rng.choice(words) if rng.random() < 0.6 else rng.choice(COMMON_WORDS)
+                    for _ in range(rng.randint(*WORDS_PER_SENTENCE))]
+        if rng.random() < 0.1:
+            sentence.append(f"[[{rng.choice(words).title()} {rng.randrange(n + 1)}]]")
+        lines.append(" ".join(sentence).capitalize() + ".")
+    return "\n".join(lines) + "\n"
+
+
+def note_path(vault, n):
+    return os.path.join(vault, f"folder{n // NOTES_PER_FOLDER:04d}", f"note{n:06d}.md")
+
+
+def write_note(vault, rng, topics, n):
+    path = note_path(vault, n)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(note_text(rng, topics, n))
+
+
+def build_vault(vault, note_count, topics, seed):
+    rng = random.Random(seed)
+    for n in range(note_count):
+        write_note(vault, rng, topics, n)
+
+
+def change_vault(vault, note_count, topics, ratio, seed):
+    """Edit, add and delete about ratio of the notes each. Returns the counts."""
+    rng = random.Random(seed + 1)
+    changes = max(1, int(note_count * ratio))
+    picks = rng.sample(range(note_count), min(note_count, changes * 2))
+    edited, deleted = picks[:changes], picks[changes:]
+    for n in edited:
+        with open(note_path(vault, n), "a", encoding="utf-8") as f:
+            f.write(note_text(rng, topics, n, sentences=2).split("\n", 6)[-1])
+    for n in deleted:
+        os.remove(note_path(vault, n))
+    for n in range(note_count, note_count + changes):
+        write_note(vault, rng, topics, n)
+    return {"edited": len(edited), "added": changes, "deleted": len(deleted)}
+
+
+def make_queries(topics, count, seed):
+    rng = random.Random(seed + 2)
+    queries = []
+    for _ in range(count):
+        words = topics[rng.randrange(len(topics))]
+        queries.append(" ".join(rng.sample(words, rng.randint(2, 5))))
+    return queries
+
+
+def percentiles(latencies_ms):
+    values = np.array(latencies_ms, dtype="float64")
+    if len(values) == 0:
+        return {}
+    return {
+        "n": int(len(values)),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p90_ms": round(float(np.percentile(values, 90)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3)
+    }
+
+
+def timed(func, *args, **kwargs):
+    """(result, elapsed seconds) of func(*args, **kwargs)"""
+    start_time = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start_time
+
+
+def latencies(func, inputs):
+    samples = []
+    for item in inputs:
+        start_time = time.perf_counter()
+        func(item)
+        samples.append((time.perf_counter() - start_time) * 1000)
+    return samples
+
+
+def file_size_mb(path):
+    return round(os.path.getsize(path) / (1024 * 1024), 3) if path and os.path.exists(path) else 0.0
+
+
+def store_sizes(memory):
+    meta = memory.safe_load_json(memory.MEMORY_META_FILE) or {}
+    return {
+        "meta_mb": file_size_mb(memory.MEMORY_META_FILE),
+        "vectors_mb": file_size_mb(meta.get("vectors_file")),
+        "ann_mb": file_size_mb(meta.get("ann_file")),
+        "registry_mb": file_size_mb(memory.OBSIDIAN_MEMORY_FILE)
+    }
+
+
+def benchmark_generation(llm, prompts, max_tokens):
+    """Time to first token and generation speed of llm over prompts"""
+    ttft = []
+    speeds = []
+    for prompt in prompts:
+        start_time = time.perf_counter()
+        first_token_time = None
+        tokens = 0
+        for chunk in llm.create_chat_completion(messages=[{"role": "user", "content": prompt}],
+                                                max_tokens=max_tokens, temperature=0.2, stream=True):
+            if chunk["choices"][0]["delta"].get("content"):
+                tokens += 1
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+        end_time = time.perf_counter()
+        if first_token_time is not None:
+            ttft.append((first_token_time - start_time) * 1000)
+            if tokens > 1 and end_time > first_token_time:
+                speeds.append((tokens - 1) / (end_time - first_token_time))
+    return {
+        "ttft": percentiles(ttft),
+        "tokens_per_sec_mean": round(float(np.mean(speeds)), 2) if speeds else None
+    }
+
+
+def run_size(memory, logic, note_count, args, topics, llm, quiet):
+    """Run every stage against a fresh vault of note_count notes"""
+    workdir = tempfile.mkdtemp(prefix=f"shendu_bench_{note_count}_")
+    vault = os.path.join(workdir, "vault")
+    result = {"notes": note_count}
+    cwd = os.getcwd()
+    try:
+        _, seconds = timed(build_vault, vault, note_count, topics, args.seed)
+        result["vault_build_s"] = round(seconds, 2)
+        os.chdir(workdir)  # the memory store files are relative to the working directory
+        memory.OBSIDIAN_FOLDER = vault
+
+        with quiet():
+            memory.load_memory()
+            report, seconds = timed(memory.update_obsidian_memory)
+        chunks = len(memory.memory_texts)
+        result["ingest_cold"] = {
+            "seconds": round(seconds, 3),
+            "chunks": chunks,
+            "notes_per_sec": round(note_count / seconds, 1),
+            "chunks_per_sec": round(chunks / seconds, 1),
+            "embed_chunks_per_sec": report.get("chunks_per_sec")
+        }
+
+        with quiet():
+            _, seconds = timed(memory.save_memory)
+        result["save"] = dict(store_sizes(memory), seconds=round(seconds, 3))
+
+        with quiet():
+            _, seconds = timed(memory.load_memory)
+        result["load"] = {
+            "seconds": round(seconds, 3),
+            "chunks": len(memory.memory_texts),
+            "index_backend": memory.vector_index.ann_backend_name(memory.ann_index),
+            "vector_storage": memory.vector_index.storage_name(memory.index)
+        }
+
+        queries = make_queries(topics, args.queries, args.seed)
+        memory.query_cache.clear()
+        memory.result_cache.clear()
+        with quiet():
+            uncached = latencies(lambda q: memory.retrieve_memories(q, memory.TOP_K_MEMORY), queries)
+            cached = latencies(lambda q: memory.retrieve_memories(q, memory.TOP_K_MEMORY), queries)
+        result["retrieval"] = {"uncached": percentiles(uncached), "cached": percentiles(cached)}
+
+        title_queries = [q.split()[0] for q in queries]
+        with quiet():
+            result["title_search"] = percentiles(latencies(lambda q: memory.search_notes_by_title(q, 10), title_queries))
+
+        count_tokens = logic.make_token_counter(llm)
+        history = []
+        for q in queries[:args.history_turns]:
+            history.append({"role": "user", "content": q})
+            history.append({"role": "assistant", "content": " ".join([q] * 8)})
+        with quiet():
+            retrieved = [memory.retrieve_memories(q, memory.TOP_K_MEMORY) for q in queries]
+            pinned = memory.personal_seed_chunks()
+        result["retrieval"]["mean_results"] = round(sum(len(r) for r in retrieved) / max(len(retrieved), 1), 2)
+
+        def build(i):
+            kept, memories, _ = logic.plan_context(list(history), queries[i], retrieved[i], count_tokens,
+                                                   pinned_memories=pinned)
+            return logic.build_prompt(kept, queries[i], memories, pinned)
+
+        result["prompt_build"] = percentiles(latencies(build, range(len(queries))))
+
+        if llm is not None:
+            prompts = [build(i) for i in range(min(args.generations, len(queries)))]
+            result["generation"] = benchmark_generation(llm, prompts, args.max_tokens)
+
+        counts = change_vault(vault, note_count, topics, args.change_ratio, args.seed)
+        with quiet():
+            report, seconds = timed(memory.update_obsidian_memory)
+        result["ingest_incremental"] = dict(counts, seconds=round(seconds, 3),
+                                            chunks_added=report["added"], chunks_removed=report["removed"])
+
+        with quiet():
+            _, seconds = timed(memory.update_obsidian_memory)
+        result["ingest_idle"] = {"seconds": round(seconds, 3)}
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            result["workdir"] = workdir
+    return result
+
+
+def environment():
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__
+    }
+    try:
+        import faiss
+        info["faiss"] = getattr(faiss, "__version__", None)
+    except ImportError:
+        pass
+    return info
+
+
+def numeric_leaves(data, prefix=""):
+    """Flatten nested dicts/lists to {dotted path: number}"""
+    leaves = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            leaves.update(numeric_leaves(value, f"{prefix}.{key}" if prefix else str(key)))
+    elif isinstance(data, list):
+        for i, value in enumerate(data):
+            key = value.get("notes", i) if isinstance(value, dict) else i
+            leaves.update(numeric_leaves(value, f"{prefix}[{key}]"))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        leaves[prefix] = data
+    return leaves
+
+
+def compare(baseline, current):
+    """Print timing and throughput changes between two result files"""
+    before = numeric_leaves(baseline["results"])
+    after = numeric_leaves(current["results"])
+    print(f"{'metric':60} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    for key in sorted(set(before) & set(after)):
+        if not re.search(r"(_ms|seconds|_s|per_sec|_mb)$", key):
+            continue
+        old, new = before[key], after[key]
+        ratio = f"{new / old:.2f}x" if old else "-"
+        print(f"{key:60} {old:>12} {new:>12} {ratio:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, retrieval and prompt building on a synthetic vault")
+    parser.add_argument("--notes", type=int, nargs="+", default=DEFAULT_NOTE_COUNTS, help="vault sizes to run, e.g. 1000 10000 100000")
+    parser.add_argument("--queries", type=int, default=200, help="queries per latency measurement")
+    parser.add_argument("--change-ratio", type=float, default=0.01, help="share of notes edited, added and deleted for the incremental sync")
+    parser.add_argument("--history-turns", type=int, default=6, help="conversation turns in the prompt-build benchmark")
+    parser.add_argument("--embedder", choices=["stub", "real"], default="stub")
+    parser.add_argument("--llm", choices=["stub", "real"], default="stub", help="real loads model.get_llama_model() for tokenizing and generation")
+    parser.add_argument("--generations", type=int, default=5, help="prompts generated with --llm real")
+    parser.add_argument("--max-tokens", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=None, help="parse processes (default memory.PARSE_WORKERS)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON results here (default: stdout)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary vaults and stores")
+    parser.add_argument("--verbose", action="store_true", help="show memory.py's progress output")
+    args = parser.parse_args()
+
+    import nltk
+    import memory
+    import logic
+
+    quiet = contextlib.nullcontext if args.verbose else lambda: contextlib.redirect_stdout(io.StringIO())
+
+    if args.embedder == "stub":
+        memory.embedder = HashEmbedder(memory.EMBED_DIM)
+    splitter = "punkt"
+    try:
+        nltk.data.find("tokenizers/punkt")
+    except LookupError:
+        splitter = "regex"
+        memory.sent_tokenize = regex_sent_tokenize
+        memory.punkt_checked = True  # offline: do not try to download it
+    if args.workers is not None:
+        memory.PARSE_WORKERS = args.workers
+    if splitter == "regex" and multiprocessing.get_start_method() != "fork":
+        memory.PARSE_WORKERS = 1  # spawned parse workers would not see the patched splitter
+
+    llm = None
+    if args.llm == "real":
+        from model import get_llama_model
+        llm = get_llama_model()
+
+    results = []
+    for note_count in args.notes:
+        print(f"⏱️  Benchmarking {note_count} notes...", file=sys.stderr)
+        results.append(run_size(memory, logic, note_count, args, make_vocabulary(args.seed), llm, quiet))
+
+    output = {
+        "format_version": RESULT_FORMAT_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "embedder": args.embedder,
+            "llm": args.llm,
+            "sentence_splitter": splitter,
+            "parse_workers": memory.PARSE_WORKERS,
+            "queries": args.queries,
+            "change_ratio": args.change_ratio,
+            "seed": args.seed,
+            "index_backend": memory.INDEX_BACKEND,
+            "vector_storage": memory.VECTOR_STORAGE,
+            "retrieval_mode": memory.RETRIEVAL_MODE,
+            "rerank": memory.RERANK_ENABLED
+        },
+        "environment": environment(),
+        "results": results
+    }
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"💾 Results written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), output)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,25 +2,14 @@ from model import get_llama_model
 from memory import (
     retrieve_memories, add_to_memory, seed_personal_memory, load_memory, 
     TOP_K_MEMORY, initialize_obsidian_memory, sync_obsidian_memory,
-    get_latest_notes, search_notes_by_title
+    get_latest_notes, search_notes_by_title, personal_seed_chunks
 )
-from logic import build_prompt
+from logic import build_prompt, plan_context, make_token_counter, MAX_CONTEXT, RESERVED_OUTPUT_TOKENS
+from vault_watcher import start_vault_sync
 import time
-import threading
 import re
 
-MAX_CONTEXT = 4096
-SYNC_INTERVAL = 300  # Sync every 5 minutes
-
-def background_sync():
-    """Background thread to sync Obsidian memory"""
-    while True:
-        try:
-            sync_obsidian_memory()
-            time.sleep(SYNC_INTERVAL)
-        except Exception as e:
-            print(f"Background sync error: {e}")
-            time.sleep(60)  # Wait 1 minute before retrying
+SYNC_INTERVAL = 300  # Polling fallback: sync every 5 minutes when file events are unavailable
 
 def handle_special_commands(user_input):
     """Handle special commands for Obsidian integration"""
@@ -47,8 +36,7 @@ def handle_special_commands(user_input):
             response = f"Found {len(matching_notes)} notes matching '{query}':\n\n"
             for note in matching_notes[:3]:  # Show top 3 matches
                 response += f"📝 **{note['title']}**\n"
-                preview = note['content'][:300] + '...' if len(note['content']) > 300 else note['content']
-                response += f"   {preview}\n\n"
+                response += f"   {note['preview']}\n\n"
             return response
         else:
             return f"No notes found matching '{query}'"
@@ -68,10 +56,11 @@ def chat():
     print("🔄 Initializing Obsidian integration...")
     initialize_obsidian_memory()
     
-    # Start background sync thread
-    sync_thread = threading.Thread(target=background_sync, daemon=True)
-    sync_thread.start()
+    # Re-index notes as they change (or poll if file events are unavailable)
+    sync_mode = start_vault_sync(SYNC_INTERVAL)
+    print(f"🔄 Vault sync mode: {sync_mode}")
     
+    count_tokens = make_token_counter(llm)
     conversation_history = []
     print("\n=== Shendu is Back online with Obsidian Integration ===")
     print("Type 'exit' to quit.")
@@ -94,20 +83,22 @@ def chat():
 
         # Regular chat processing
         personal_memories = retrieve_memories(user_input, TOP_K_MEMORY)
-        prompt = build_prompt(conversation_history, user_input, personal_memories)
-
-        if len(prompt.split()) > MAX_CONTEXT:
-            print("⚠️ Context too long, trimming conversation.")
-            while len(prompt.split()) > MAX_CONTEXT and conversation_history:
-                conversation_history.pop(0)
-                prompt = build_prompt(conversation_history, user_input, personal_memories)
+        pinned_memories = personal_seed_chunks()
+        history, personal_memories, plan = plan_context(
+            conversation_history, user_input, personal_memories, count_tokens, MAX_CONTEXT,
+            pinned_memories=pinned_memories
+        )
+        if plan["messages_dropped"]:
+            print(f"⚠️ Context too long, dropped {plan['messages_dropped']} old messages.")
+            del conversation_history[:plan["messages_dropped"]]
+        prompt = build_prompt(history, user_input, personal_memories, pinned_memories)
 
         print(" Shendu (Lemme think...)\n")
         start_time = time.time()
 
         stream = llm.create_chat_completion(
             messages=[{"role": "user", "content": prompt}],
-            max_tokens=1024,
+            max_tokens=RESERVED_OUTPUT_TOKENS,
             temperature=0.2,
             top_p=0.95,
             stream=True
@@ -0,0 +1,211 @@
+"""
+Inference scheduler for the API.
+
+llama.cpp generation and query embedding are CPU-bound and blocking, so the
+FastAPI handlers hand them to worker threads through a bounded queue instead
+of running them on the event loop. When the queue is full, submit() raises
+QueueFullError and the API answers 503.
+
+Each worker thread owns a slot: one llama.cpp context from get_llama_model().
+A Llama object is not safe to use from two threads, but separate contexts
+decode in parallel (llama.cpp releases the GIL during evaluation), so with N
+slots N requests generate at once. Any free slot takes the next queued job;
+sessions.py restores a session's KV state into whichever slot runs its turn.
+The high-level llama_cpp API cannot batch several sequences into one
+decode, so parallelism comes from the slots rather than batched decoding.
+
+How many slots fit is decided by load_slots(): no more than the cores can
+run without oversubscribing (physical cores / threads per context) and only
+while free RAM covers another context. A model loaded with n_threads above
+half the physical cores therefore gets one slot under "auto" - as does the
+usual cpu_count() // 2 on CPUs with two hardware threads per core, where
+that equals the physical core count. Parallel slots need INFERENCE_SLOTS
+set explicitly or contexts loaded with fewer threads each.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import psutil
+
+import metrics
+
+MAX_QUEUE_SIZE = 8  # requests waiting for a slot before new ones get a 503
+INFERENCE_SLOTS = "auto"  # model contexts serving requests in parallel, or "auto" (by cores and free RAM)
+MAX_INFERENCE_SLOTS = 4
+SLOT_RAM_HEADROOM_MB = 1024  # RAM left free after loading another slot
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue cannot take another request"""
+
+
+class Slot:
+    """One model context and its utilization counters"""
+
+    def __init__(self, index, llm):
+        self.index = index
+        self.llm = llm
+        self.started = time.time()
+        self.busy_since = None  # start of the running job, None while idle
+        self.busy_seconds = 0.0
+        self.processed = 0
+        self.failed = 0
+        self.tokens = 0  # generated tokens, from the jobs' completion_tokens
+
+
+class InferenceScheduler:
+    """Run jobs from one queue on a pool of model slots, one job per slot at a time"""
+
+    def __init__(self, llm, max_queue=MAX_QUEUE_SIZE):
+        self.jobs = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.slots = []
+        self.stats = {
+            "processed": 0,
+            "rejected": 0,
+            "failed": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "last_wait_ms": 0.0
+        }
+        self.add_slot(llm)
+
+    def add_slot(self, llm):
+        """Start serving jobs with another model context"""
+        with self.lock:
+            slot = Slot(len(self.slots), llm)
+            self.slots.append(slot)
+        threading.Thread(target=self.run, args=(slot,), daemon=True).start()
+        return slot
+
+    def submit(self, func, *args, **kwargs):
+        """Queue func(llm, *args, **kwargs). Returns a Future for its result.
+
+        The result is func's return value; dict results get queue_wait_ms and
+        the slot that ran them added.
+        """
+        future = Future()
+        try:
+            self.jobs.put_nowait((func, args, kwargs, future, time.time()))
+        except queue.Full:
+            with self.lock:
+                self.stats["rejected"] += 1
+            raise QueueFullError(f"inference queue is full ({self.jobs.maxsize} waiting)")
+        return future
+
+    def run(self, slot):
+        while True:
+            func, args, kwargs, future, enqueued = self.jobs.get()
+            wait_ms = (time.time() - enqueued) * 1000
+            with self.lock:
+                slot.busy_since = time.time()
+                self.stats["total_wait_ms"] += wait_ms
+                self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], wait_ms)
+                self.stats["last_wait_ms"] = wait_ms
+            metrics.observe_stage("queue_wait", wait_ms)
+            try:
+                if future.set_running_or_notify_cancel():
+                    result = func(slot.llm, *args, **kwargs)
+                    if isinstance(result, dict):
+                        result["queue_wait_ms"] = round(wait_ms, 1)
+                        result["slot"] = slot.index
+                    future.set_result(result)
+                    with self.lock:
+                        self.stats["processed"] += 1
+                        slot.processed += 1
+                        if isinstance(result, dict):
+                            slot.tokens += result.get("completion_tokens") or 0
+            except Exception as e:
+                with self.lock:
+                    self.stats["failed"] += 1
+                    slot.failed += 1
+                future.set_exception(e)
+            finally:
+                with self.lock:
+                    slot.busy_seconds += time.time() - slot.busy_since
+                    slot.busy_since = None
+                self.jobs.task_done()
+
+    def slot_stats(self, slot, now):
+        """Utilization (busy share of the slot's lifetime) and generated tokens per busy second (lock held)"""
+        busy_seconds = slot.busy_seconds + (now - slot.busy_since if slot.busy_since else 0.0)
+        return {
+            "slot": slot.index,
+            "busy": slot.busy_since is not None,
+            "processed": slot.processed,
+            "failed": slot.failed,
+            "tokens": slot.tokens,
+            "utilization": round(busy_seconds / max(now - slot.started, 1e-9), 3),
+            "tokens_per_sec": round(slot.tokens / slot.busy_seconds, 2) if slot.busy_seconds else None
+        }
+
+    def get_stats(self):
+        """Queue depth, wait times, throughput counters and per-slot utilization"""
+        now = time.time()
+        with self.lock:
+            started = self.stats["processed"] + self.stats["failed"]
+            slots = [self.slot_stats(slot, now) for slot in self.slots]
+            return dict(
+                self.stats,
+                queue_depth=self.jobs.qsize(),
+                max_queue=self.jobs.maxsize,
+                busy_slots=sum(1 for s in slots if s["busy"]),
+                avg_wait_ms=round(self.stats["total_wait_ms"] / started, 1) if started else 0.0,
+                slots=slots
+            )
+
+
+def process_rss_mb():
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def target_slot_count(llm):
+    """INFERENCE_SLOTS, or for "auto" the contexts the physical cores can run at once
+
+    With n_threads above half the physical cores this is 1: a second
+    context at full thread count would only oversubscribe the cores.
+    At exactly half it is 2.
+    """
+    if INFERENCE_SLOTS != "auto":
+        return max(1, int(INFERENCE_SLOTS))
+    cores = psutil.cpu_count(logical=False) or os.cpu_count() or 1
+    threads = getattr(llm, "n_threads", None) or cores
+    return max(1, min(MAX_INFERENCE_SLOTS, cores // threads))
+
+
+def load_slots(scheduler, load_model, slot_mb):
+    """Add slots from load_model() up to target_slot_count(), while free RAM allows.
+
+    load_model() must return a new, independent context on every call;
+    loading stops if it returns one that already backs a slot.
+    slot_mb is the RAM the first context took; each new slot's measured
+    cost replaces it (contexts share the memory-mapped weights, so later
+    slots usually cost only their KV cache).
+    """
+    target = target_slot_count(scheduler.slots[0].llm)
+    if target == 1 and INFERENCE_SLOTS == "auto":
+        print("ℹ️  One inference slot: the model's n_threads leaves too few physical cores for a second context")
+    while len(scheduler.slots) < target:
+        available_mb = psutil.virtual_memory().available / (1024 * 1024)
+        if available_mb < slot_mb + SLOT_RAM_HEADROOM_MB:
+            print(f"⚠️  Stopping at {len(scheduler.slots)} inference slot(s): "
+                  f"{available_mb:.0f} MB free, another slot needs ~{slot_mb:.0f} MB")
+            break
+        before = process_rss_mb()
+        try:
+            llm = load_model()
+        except Exception as e:
+            print(f"❌ Failed to load inference slot {len(scheduler.slots)}: {e}")
+            break
+        if any(llm is slot.llm for slot in scheduler.slots):
+            # load_model() handed back a context that is already serving a slot;
+            # driving it from two threads would corrupt its state
+            print(f"⚠️  Stopping at {len(scheduler.slots)} inference slot(s): the model loader returned a shared context")
+            break
+        slot_mb = max(process_rss_mb() - before, 1.0)
+        scheduler.add_slot(llm)
+        print(f"✅ Inference slot {len(scheduler.slots) - 1} ready (~{slot_mb:.0f} MB)")
+    return len(scheduler.slots)
@@ -2,6 +2,7 @@
 """
 Installation and setup verification script for Shendu Knowledge Vault
 """
+import importlib.util
 
 def check_dependencies():
     """Check if all dependencies are installed"""
@@ -23,12 +24,13 @@ def check_dependencies():
     missing = []
     installed = []
     
+    # find_spec locates a package without importing it (torch, llama_cpp and
+    # matplotlib take seconds each to import)
     for package, pip_name in required_packages:
-        try:
-            __import__(package)
+        if importlib.util.find_spec(package) is not None:
             print(f"✅ {package}")
             installed.append(package)
-        except ImportError:
+        else:
             print(f"❌ {package} (install with: pip install {pip_name})")
             missing.append((package, pip_name))
             
@@ -0,0 +1,103 @@
+"""
+In-memory BM25 index for exact-term retrieval.
+
+Dense embeddings blur identifiers such as project, model and certification
+names ("OPT-1.3b", "SST-2", "IELTS"); a lexical index finds them exactly.
+memory.py keeps one index over memory_texts (built on the first hybrid
+search, then updated with every vector insert/remove) and one over note
+titles, and fuses lexical and vector rankings with reciprocal-rank fusion
+(see rrf_fuse).
+"""
+import heapq
+import math
+import re
+from collections import Counter
+
+BM25_K1 = 1.2  # term frequency saturation
+BM25_B = 0.75  # document length normalization
+RRF_K = 60  # reciprocal-rank fusion constant; higher flattens the rank weights
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have i in is it its my note of on or that the this to was "
+    "were what when where which who will with you your".split()
+)
+
+
+def tokenize(text):
+    """Lowercase terms; compound identifiers (opt-1.3b) are kept whole and split into parts"""
+    terms = []
+    for match in TOKEN_PATTERN.findall(text.lower()):
+        if match not in STOPWORDS:
+            terms.append(match)
+        if any(sep in match for sep in "-_."):
+            terms.extend(part for part in re.split(r"[-_.]", match) if part and part not in STOPWORDS)
+    return terms
+
+
+class LexicalIndex:
+    """Inverted index with BM25 scoring, supporting incremental add/remove.
+
+    Documents are keyed by any hashable id (chunk ids, file paths). Removal
+    takes the document text again instead of keeping per-document term
+    lists, so the index costs little more than its postings.
+    """
+
+    def __init__(self):
+        self.postings = {}  # term -> {doc id: term frequency}
+        self.doc_lengths = {}  # doc id -> number of terms
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, doc_id, text):
+        if doc_id in self.doc_lengths:
+            return
+        terms = tokenize(text)
+        for term, tf in Counter(terms).items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        self.doc_lengths[doc_id] = len(terms)
+        self.total_length += len(terms)
+
+    def add_many(self, docs):
+        for doc_id, text in docs:
+            self.add(doc_id, text)
+
+    def remove(self, doc_id, text):
+        length = self.doc_lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for term in set(tokenize(text)):
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self.postings[term]
+
+    def search(self, query, top_k):
+        """Return [(doc id, score)] of the top_k documents by BM25 score"""
+        n_docs = len(self.doc_lengths)
+        if n_docs == 0:
+            return []
+        avg_length = self.total_length / n_docs or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+
+def rrf_fuse(rankings, top_k, k=RRF_K):
+    """Fuse ranked id lists by reciprocal rank: score(id) = sum 1 / (k + rank)"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return [doc_id for doc_id, _ in sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]]
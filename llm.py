@@ -12,6 +12,7 @@ nltk.download('punkt')
 
 
 from nltk import sent_tokenize
+from logic import plan_context, make_token_counter, RESERVED_OUTPUT_TOKENS
 
 # ---------------- Configuration ----------------
 MODEL_PATH = r"C:\Users\Arun\Downloads\test\llama.cpp\models\mistral-7b-instruct-v0.1.Q4_K_M.gguf"
@@ -24,6 +25,10 @@ TOP_P = 0.95
 MEMORY_FILE = "memory_store.json"
 EMBED_DIM = 384  # Using MiniLM-L6-v2
 TOP_K_MEMORY = 8
+SYSTEM_PROMPT = (
+    "You are Shendu, Arun Prakash S's personal AI research assistant. "
+    "Always use Arun's personal facts to personalize replies in NLP, NER, NLG, Quantum Computing, AI Research."
+)
 
 # ---------------- Load Model ----------------
 llm = Llama(
@@ -307,8 +312,7 @@ def build_prompt(conversation_history, user_input, personal_memories):
         [f"<{msg['role']}>\n{msg['content']}\n</{msg['role']}>" for msg in conversation_history]
     )
     prompt = (
-        f"<system>\nYou are Shendu, Arun Prakash S's personal AI research assistant. "
-        f"Always use Arun's personal facts to personalize replies in NLP, NER, NLG, Quantum Computing, AI Research.\n</system>\n\n"
+        f"<system>\n{SYSTEM_PROMPT}\n</system>\n\n"
         f"<personal_memory>\n{memory_block}\n</personal_memory>\n\n"
         f"{conversation_block}\n"
         f"<user>\n{user_input}\n</user>\n\n"
@@ -318,6 +322,7 @@ def build_prompt(conversation_history, user_input, personal_memories):
 
 # ---------------- Chat Loop ----------------
 def chat():
+    count_tokens = make_token_counter(llm)
     conversation_history = []
     print("\n=== Shendu is Back online ===")
     print("Type 'exit' to quit.\n")
@@ -328,20 +333,21 @@ def chat():
             break
 
         personal_memories = retrieve_memories(user_input, TOP_K_MEMORY)
-        prompt = build_prompt(conversation_history, user_input, personal_memories)
-
-        if len(prompt.split()) > MAX_CONTEXT:
-            print("⚠️ Context too long, trimming conversation.")
-            while len(prompt.split()) > MAX_CONTEXT and conversation_history:
-                conversation_history.pop(0)
-                prompt = build_prompt(conversation_history, user_input, personal_memories)
+        history, personal_memories, plan = plan_context(
+            conversation_history, user_input, personal_memories, count_tokens,
+            MAX_CONTEXT, RESERVED_OUTPUT_TOKENS, SYSTEM_PROMPT
+        )
+        if plan["messages_dropped"]:
+            print(f"⚠️ Context too long, dropped {plan['messages_dropped']} old messages.")
+            del conversation_history[:plan["messages_dropped"]]
+        prompt = build_prompt(history, user_input, personal_memories)
 
         print(" Shendu (Lemme think...)\n")
         start_time = time.time()
 
         stream = llm.create_chat_completion(
             messages=[{"role": "user", "content": prompt}],
-            max_tokens=1024,
+            max_tokens=RESERVED_OUTPUT_TOKENS,
             temperature=TEMPERATURE,
             top_p=TOP_P,
             stream=True
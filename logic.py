@@ -1,9 +1,134 @@
-def build_prompt(conversation_history, user_input, personal_memories):
+import threading
+from collections import OrderedDict
+
+MAX_CONTEXT = 4096  # must match n_ctx of the loaded model
+RESERVED_OUTPUT_TOKENS = 1024  # room kept free for the reply (max_tokens)
+CONTEXT_SAFETY_MARGIN = 32  # chat template tokens and segment-boundary merges
+MEMORY_TOKEN_SHARE = 0.5  # share of the free budget retrieved memories may take before history
+MEMORY_TOKEN_CAP = 1024  # hard cap on retrieved memory tokens, whatever the free budget
+TOKEN_CACHE_SIZE = 4096  # cached per-segment token counts
+# Segment order of the prompt:
+#   stable  - system, pinned memories, history, per-turn retrieval, user input.
+#             Everything up to the end of the history is identical from one turn
+#             to the next, so llama.cpp's prompt cache reuses it.
+#   classic - retrieved memories right after the system prompt (the original
+#             layout); a new retrieval set invalidates the cached history.
+PROMPT_LAYOUT = "stable"
+
+# Enhanced system prompt
+SYSTEM_PROMPT = (
+    "You are Shendu, Arun Prakash S's personal AI research assistant. "
+    "You have access to Arun's personal information, research notes, and Obsidian knowledge vault. "
+    "Always use this information to provide personalized, contextual responses. "
+    "Focus on NLP, NER, NLG, Quantum Computing, and AI Research. "
+    "When referencing information from Obsidian notes, mention the note title for context."
+)
+
+
+def format_message(msg):
+    return f"<{msg['role']}>\n{msg['content']}\n</{msg['role']}>"
+
+
+def memory_text(memory):
+    """Text of a retrieved memory - a RetrievedMemory tuple or a plain string"""
+    return getattr(memory, "text", memory)
+
+
+def make_token_counter(llm=None):
+    """Return count_tokens(text) backed by the model tokenizer, with an LRU cache.
+
+    Without a model, falls back to a conservative estimate (~3 characters
+    per token) so callers can still budget. Safe to share between the API's
+    inference slots.
+    """
+    cache = OrderedDict()
+    lock = threading.Lock()
+
+    def count_tokens(text):
+        with lock:
+            if text in cache:
+                cache.move_to_end(text)
+                return cache[text]
+        if llm is not None:
+            count = len(llm.tokenize(text.encode("utf-8"), add_bos=False))
+        else:
+            count = len(text) // 3 + 1
+        with lock:
+            cache[text] = count
+            if len(cache) > TOKEN_CACHE_SIZE:
+                cache.popitem(last=False)
+        return count
+
+    return count_tokens
+
+
+def plan_context(conversation_history, user_input, personal_memories, count_tokens,
+                 max_context=MAX_CONTEXT, reserve_output=RESERVED_OUTPUT_TOKENS,
+                 system_prompt=SYSTEM_PROMPT, pinned_memories=()):
+    """Fit memories and history into the context window in a single pass.
+
+    Each segment is tokenized once (counts are cached across turns). The
+    system prompt, pinned memories, user input and reserved output tokens are
+    fixed costs; retrieved memories (minus any already pinned) are kept in
+    rank order up to MEMORY_TOKEN_SHARE of what is left (at most
+    MEMORY_TOKEN_CAP), and the rest goes to the most recent history turns.
+
+    Returns (history, memories, plan) where history is a suffix of
+    conversation_history and plan reports the token allocation.
+    """
+    fixed = (count_tokens(f"<system>\n{system_prompt}\n</system>\n")
+             + count_tokens(f"<user>\n{user_input}\n</user>\n\n<assistant>\n")
+             + count_tokens("<personal_memory>\n</personal_memory>\n<knowledge_vault>\n</knowledge_vault>\n")
+             + sum(count_tokens(memory) + 1 for memory in pinned_memories)
+             + reserve_output + CONTEXT_SAFETY_MARGIN)
+    if pinned_memories:
+        fixed += count_tokens("<personal_memory>\n</personal_memory>\n")
+    budget = max(0, max_context - fixed)
+
+    pinned = set(pinned_memories)
+    personal_memories = [memory for memory in personal_memories if memory_text(memory) not in pinned]
+
+    memories = []
+    memory_tokens = 0
+    memory_budget = min(int(budget * MEMORY_TOKEN_SHARE), MEMORY_TOKEN_CAP)
+    for memory in personal_memories:
+        cost = count_tokens(memory_text(memory)) + 1
+        if memory_tokens + cost > memory_budget:
+            break
+        memories.append(memory)
+        memory_tokens += cost
+
+    history_tokens = 0
+    history_budget = budget - memory_tokens
+    kept = 0
+    for msg in reversed(conversation_history):
+        cost = count_tokens(format_message(msg)) + 1
+        if history_tokens + cost > history_budget:
+            break
+        history_tokens += cost
+        kept += 1
+    history = conversation_history[len(conversation_history) - kept:]
+
+    plan = {
+        "max_context": max_context,
+        "fixed_tokens": fixed,
+        "memory_tokens": memory_tokens,
+        "history_tokens": history_tokens,
+        "memories_dropped": len(personal_memories) - len(memories),
+        "messages_dropped": len(conversation_history) - len(history)
+    }
+    return history, memories, plan
+
+
+def build_prompt(conversation_history, user_input, personal_memories, pinned_memories=(), layout=PROMPT_LAYOUT):
     # Separate Obsidian notes from regular memories
     obsidian_memories = []
     regular_memories = []
     
-    for memory in personal_memories:
+    pinned = set(pinned_memories)
+    for memory in map(memory_text, personal_memories):
+        if memory in pinned:
+            continue
         if memory.startswith("From note '"):
             obsidian_memories.append(memory)
         else:
@@ -15,35 +140,36 @@ def build_prompt(conversation_history, user_input, personal_memories):
     
     # Build conversation block
     conversation_block = "\n".join(
-        [f"<{msg['role']}>\n{msg['content']}\n</{msg['role']}>" for msg in conversation_history]
-    )
-    
-    # Enhanced system prompt
-    system_prompt = (
-        "You are Shendu, Arun Prakash S's personal AI research assistant. "
-        "You have access to Arun's personal information, research notes, and Obsidian knowledge vault. "
-        "Always use this information to provide personalized, contextual responses. "
-        "Focus on NLP, NER, NLG, Quantum Computing, and AI Research. "
-        "When referencing information from Obsidian notes, mention the note title for context."
+        [format_message(msg) for msg in conversation_history]
     )
     
     # Build the complete prompt
     prompt_parts = [
-        f"<system>\n{system_prompt}\n</system>\n"
+        f"<system>\n{SYSTEM_PROMPT}\n</system>\n"
     ]
     
-    # Add regular personal memories
-    if regular_memory_block:
-        prompt_parts.append(f"<personal_memory>\n{regular_memory_block}\n</personal_memory>\n")
+    # Add pinned memories - the same every turn, so they stay in the cached prefix
+    if pinned_memories:
+        pinned_block = "\n".join(pinned_memories)
+        prompt_parts.append(f"<personal_memory>\n{pinned_block}\n</personal_memory>\n")
     
-    # Add Obsidian knowledge
+    # Add retrieved memories (after the history in the stable layout)
+    memory_parts = []
+    if regular_memory_block:
+        memory_parts.append(f"<personal_memory>\n{regular_memory_block}\n</personal_memory>\n")
     if obsidian_memory_block:
-        prompt_parts.append(f"<knowledge_vault>\n{obsidian_memory_block}\n</knowledge_vault>\n")
+        memory_parts.append(f"<knowledge_vault>\n{obsidian_memory_block}\n</knowledge_vault>\n")
+    
+    if layout == "classic":
+        prompt_parts.extend(memory_parts)
     
     # Add conversation history
     if conversation_block:
         prompt_parts.append(f"{conversation_block}\n")
     
+    if layout != "classic":
+        prompt_parts.extend(memory_parts)
+    
     # Add current user input
     prompt_parts.append(f"<user>\n{user_input}\n</user>\n\n<assistant>\n")
     
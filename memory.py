@@ -1,4 +1,3 @@
-from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
 import json
@@ -12,56 +11,188 @@ from pathlib import Path
 import frontmatter
 import re
 import shutil
+import glob
+import base64
+import threading
+import functools
+import multiprocessing
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import vector_index
+import lexical_index
+from note_catalog import NoteCatalog
 
-nltk.download('punkt', quiet=True)
-
-MEMORY_FILE = "memory_store.json"
+MEMORY_FILE = "memory_store.json"  # Legacy JSON store, migrated on first load
+MEMORY_META_FILE = "memory_meta.json"  # Ids, texts and pointer to the vector file
+MEMORY_VECTORS_PREFIX = "memory_vectors"  # float32 .npy files, one per saved generation
+MEMORY_STORE_VERSION = 2
+MEMORY_JOURNAL_FILE = "memory_journal.jsonl"  # Append-only log of inserts and removals since the last save
+JOURNAL_COMPACT_THRESHOLD = 200  # journal entries before compacting into the main store
+JOURNAL_COMPACT_INTERVAL = 10 * 60  # seconds a non-empty journal may wait for compaction by a sync
 OBSIDIAN_MEMORY_FILE = "obsidian_memory.json"
 MEMORY_BACKUP_DIR = "memory_backups"
+MAX_MEMORY_BACKUPS = 5  # older backups are rotated out
+MEMORY_BACKUP_INTERVAL = 30 * 60  # seconds between routine backups; migrations always back up
 EMBED_DIM = 384
 TOP_K_MEMORY = 8
+INDEX_BACKEND = "auto"  # flat | hnsw | ivfpq | auto (chosen by corpus size)
+VECTOR_STORAGE = "float32"  # float32 | float16 | int8 | pq - in-RAM vector format; lossy formats are rescored from disk
+ANN_INDEX_PREFIX = "memory_ann"  # persisted trained index, one per saved generation
+ANN_REBUILD_STALE_RATIO = 0.2  # rebuild an HNSW graph once this share of its nodes were removed
+QUERY_CACHE_SIZE = 256  # recent query embeddings / result lists kept in memory
+MIN_MEMORY_SIMILARITY = 0.3  # cosine similarity below which a retrieved chunk is dropped (unless it matched by keyword)
+MIN_KEYWORD_SCORE = 3.0  # BM25 score that counts as a keyword match (a query term in roughly <5% of chunks)
+RETRIEVAL_MODE = "hybrid"  # hybrid (BM25 + vector, fused by reciprocal rank) | vector
+HYBRID_CANDIDATES = 32  # candidates taken from each ranking before fusion
+RERANK_ENABLED = False  # rerank retrieved candidates with a cross-encoder (loads a second model)
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_CANDIDATES = 50  # candidates over-fetched for the reranker
+RERANK_MIN_SCORE = 0.0  # ms-marco logit; chunks scoring below are dropped as irrelevant
+RERANK_BUDGET_MS = 200  # rerank time per query before falling back to retrieval order
+RERANK_BATCH_SIZE = 16  # (query, chunk) pairs per cross-encoder forward pass
 
 # Configuration - UPDATE THIS PATH TO YOUR OBSIDIAN VAULT
 OBSIDIAN_FOLDER = r"C:\Users\Arun\Documents\Obsidian Vault"  # Update this path
 SUPPORTED_EXTENSIONS = ['.md', '.txt']
 CHUNK_SIZE = 5  # sentences per chunk
+EMBED_BATCH_SIZE = 64  # chunks per SentenceTransformer forward pass during ingestion
+PARSE_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # processes parsing/chunking notes; 1 disables the pool
+PARALLEL_PARSE_MIN_FILES = 16  # below this many changed files, parse serially
 RESCAN_INTERVAL = 60  # seconds between folder scans
+NOTE_PREVIEW_CHARS = 300  # content kept in the registry for note listings
+PERSONAL_PROFILE = '''I am Arun Prakash S, a passionate AI researcher specializing in Natural Language Processing, Named Entity Recognition, Natural Language Generation, and Quantum Computing. I work on cutting-edge AI projects and research.'''
+
+RetrievedMemory = namedtuple("RetrievedMemory", ["text", "score", "source"])
+
+embedder = None  # loaded on first use so parse worker processes never pay for it
+reranker = None  # cross-encoder, loaded on first rerank; False if it failed to load
+model_lock = threading.Lock()  # API startup loads the embedder while requests may already need it
+punkt_checked = False
+
+def create_index(train_vectors=None):
+    """Create an empty ID-mapped index so chunks can be removed individually
 
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
-index = faiss.IndexFlatIP(EMBED_DIM)
-memory_texts = []
-obsidian_metadata = {}  # Store file metadata for change detection
+    Vectors are stored as VECTOR_STORAGE; int8 and PQ are trained on
+    train_vectors.
+    """
+    return faiss.IndexIDMap2(vector_index.build_storage_index(VECTOR_STORAGE, EMBED_DIM, train_vectors))
+
+index = create_index()
+# Full-precision vectors behind a lossy index: the memory-mapped vector file
+# of the last save, plus vectors added since
+stored_vectors = np.zeros((0, EMBED_DIM), dtype="float32")
+stored_rows = {}  # chunk id -> row in stored_vectors
+pending_vectors = {}  # chunk id -> vector not yet in a saved vector file
+ann_index = None  # derived ANN index over the same ids, None when searching the flat index
+lexical = None  # BM25 over memory_texts, same ids as the vector index; built on first hybrid search
+note_catalog = NoteCatalog()  # title/recency indexes over the registry, for note lookups
+memory_texts = {}  # chunk id -> text
+next_memory_id = 0
+journal_entries = 0  # inserts/removals in the journal not yet compacted into the main store
+last_compaction = time.time()  # last time the main store was rewritten
+obsidian_metadata = {}  # Per-file registry: hash, modified, chunk ids and chunk hashes
+last_sync_report = {}  # Summary of the most recent Obsidian sync
+memory_lock = threading.RLock()  # Serializes index/text mutation between chat and vault sync threads
+sync_lock = threading.Lock()  # Serializes vault syncs with each other; held while scanning and embedding
+index_version = 0  # bumped on every index change; invalidates cached result lists
+query_cache = OrderedDict()  # normalized query -> embedding (LRU)
+result_cache = OrderedDict()  # (normalized query, top_k, index_version) -> chunk ids (LRU)
+query_cache_stats = {"hits": 0, "misses": 0, "result_hits": 0, "result_misses": 0}
+query_cache_lock = threading.Lock()
+pinned_memories = None  # personal profile chunks, built on first use
+
+def with_memory_lock(func):
+    """Run func while holding memory_lock"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with memory_lock:
+            return func(*args, **kwargs)
+    return wrapper
 
 def create_backup_dir():
     """Create backup directory if it doesn't exist"""
     if not os.path.exists(MEMORY_BACKUP_DIR):
         os.makedirs(MEMORY_BACKUP_DIR)
 
-def backup_memory_file():
-    """Create a backup of the current memory file"""
-    if os.path.exists(MEMORY_FILE):
-        create_backup_dir()
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = os.path.join(MEMORY_BACKUP_DIR, f"memory_store_{timestamp}.json")
-        shutil.copy(MEMORY_FILE, backup_path)
-        print(f"📁 Created backup: {backup_path}")
-        return backup_path
-    return None
-
-def safe_save_json(data, filepath, backup=True):
+def list_backups():
+    """Backup directories, oldest first (legacy memory_store_*.json backup files are left alone)"""
+    if not os.path.isdir(MEMORY_BACKUP_DIR):
+        return []
+    return sorted(b for b in os.listdir(MEMORY_BACKUP_DIR)
+                  if b.startswith("memory_store_") and os.path.isdir(os.path.join(MEMORY_BACKUP_DIR, b)))
+
+def backup_memory_file(force=False):
+    """Create a backup of the current memory store, keeping the newest MAX_MEMORY_BACKUPS
+
+    Every save rewrites the store, so routine backups are taken at most once
+    per MEMORY_BACKUP_INTERVAL; pass force for migrations and format changes.
+    """
+    backups = list_backups()
+    if not force and backups:
+        newest = os.path.getmtime(os.path.join(MEMORY_BACKUP_DIR, backups[-1]))
+        if time.time() - newest < MEMORY_BACKUP_INTERVAL:
+            return None
+    
+    meta = safe_load_json(MEMORY_META_FILE) if os.path.exists(MEMORY_META_FILE) else None
+    if meta is None and os.path.exists(MEMORY_META_FILE):
+        return preserve_corrupt_meta()
+    files = []
+    if meta is not None:
+        files = [MEMORY_META_FILE, meta.get("vectors_file")]
+    elif os.path.exists(MEMORY_FILE):
+        files = [MEMORY_FILE]
+    files = [f for f in files if f and os.path.exists(f)]
+    if not files:
+        return None
+    
+    create_backup_dir()
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    backup_path = os.path.join(MEMORY_BACKUP_DIR, f"memory_store_{timestamp}")
+    os.makedirs(backup_path)
+    for f in files:
+        shutil.copy(f, backup_path)
+    print(f"📁 Created backup: {backup_path}")
+    rotate_backups()
+    return backup_path
+
+def preserve_corrupt_meta():
+    """Copy an unreadable metadata file aside so the next save cannot overwrite it"""
+    root, ext = os.path.splitext(MEMORY_META_FILE)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    corrupt_path = f"{root}.corrupt-{timestamp}{ext}"
+    try:
+        shutil.copy(MEMORY_META_FILE, corrupt_path)
+        print(f"📁 Kept unreadable {MEMORY_META_FILE} as {corrupt_path}")
+        return corrupt_path
+    except Exception as e:
+        print(f"❌ Error preserving {MEMORY_META_FILE}: {e}")
+        return None
+
+def rotate_backups():
+    """Delete all but the newest MAX_MEMORY_BACKUPS backups"""
+    try:
+        for old_backup in list_backups()[:-MAX_MEMORY_BACKUPS]:
+            shutil.rmtree(os.path.join(MEMORY_BACKUP_DIR, old_backup))
+    except Exception as e:
+        print(f"❌ Error rotating backups: {e}")
+
+def safe_save_json(data, filepath, backup=True, indent=2, verify=True):
     """Safely save JSON with atomic write and backup"""
+    temp_file = filepath + ".tmp"
     try:
         if backup and os.path.exists(filepath):
             backup_memory_file()
         
         # Write to temporary file first
-        temp_file = filepath + ".tmp"
         with open(temp_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
+            json.dump(data, f, indent=indent, separators=None if indent else (",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
         
         # Verify the temp file is valid JSON
-        with open(temp_file, "r", encoding="utf-8") as f:
-            json.load(f)  # This will raise an exception if invalid
+        if verify:
+            with open(temp_file, "r", encoding="utf-8") as f:
+                json.load(f)  # This will raise an exception if invalid
         
         # If verification passed, replace the original file
         if os.path.exists(filepath):
@@ -97,8 +228,111 @@ def safe_load_json(filepath):
         print(f"❌ Error loading {filepath}: {e}")
         return None
 
+def get_embedder():
+    """Load the sentence embedder on first use (importing sentence_transformers pulls in torch)"""
+    global embedder
+    with model_lock:
+        if embedder is None:
+            from sentence_transformers import SentenceTransformer
+            embedder = SentenceTransformer("all-MiniLM-L6-v2")
+    return embedder
+
+def get_reranker():
+    """Load the cross-encoder on first use. Returns None if it cannot be loaded."""
+    global reranker
+    with model_lock:
+        if reranker is None:
+            try:
+                from sentence_transformers import CrossEncoder
+                reranker = CrossEncoder(RERANK_MODEL)
+            except Exception as e:
+                print(f"⚠️  Reranker unavailable ({e}) - using retrieval order")
+                reranker = False
+    return reranker or None
+
+def ensure_punkt():
+    """Download the sentence tokenizer data the first time this process needs it"""
+    global punkt_checked
+    if not punkt_checked:
+        # Only hit the network when the tokenizer data is missing - parse workers call this too
+        try:
+            nltk.data.find('tokenizers/punkt')
+        except LookupError:
+            nltk.download('punkt', quiet=True)
+        punkt_checked = True
+
+def rerank_scores(query, texts):
+    """Cross-encoder relevance of each text to query, scored in batches.
+
+    Returns None when the model is unavailable or RERANK_BUDGET_MS runs out
+    before every batch is scored; the caller then keeps retrieval order.
+    """
+    model = get_reranker()
+    if model is None:
+        return None
+    start_time = time.perf_counter()
+    scores = []
+    for i in range(0, len(texts), RERANK_BATCH_SIZE):
+        if (time.perf_counter() - start_time) * 1000 > RERANK_BUDGET_MS:
+            return None
+        batch = texts[i:i + RERANK_BATCH_SIZE]
+        scores.extend(float(score) for score in model.predict([(query, text) for text in batch], batch_size=RERANK_BATCH_SIZE))
+    return scores
+
+def normalize_vectors(vectors):
+    """L2-normalize rows to unit length, so inner-product search ranks by cosine similarity"""
+    vectors = np.array(vectors, dtype="float32").reshape(-1, EMBED_DIM)
+    faiss.normalize_L2(vectors)
+    return vectors
+
 def embed_text(text):
-    return embedder.encode([text])[0]
+    return normalize_vectors(get_embedder().encode([text]))[0]
+
+def normalize_query(query):
+    """Case- and whitespace-fold a query; all-MiniLM-L6-v2 is uncased so this is lossless"""
+    return " ".join(query.lower().split())
+
+def cache_get(cache, key, stat):
+    with query_cache_lock:
+        if key in cache:
+            cache.move_to_end(key)
+            query_cache_stats[stat + "hits"] += 1
+            return cache[key]
+        query_cache_stats[stat + "misses"] += 1
+        return None
+
+def cache_put(cache, key, value):
+    with query_cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > QUERY_CACHE_SIZE:
+            cache.popitem(last=False)
+
+def embed_query(query):
+    """Embed a query, skipping the transformer for recently seen queries"""
+    key = normalize_query(query)
+    emb = cache_get(query_cache, key, "")
+    if emb is None:
+        emb = embed_text(key).astype("float32")
+        cache_put(query_cache, key, emb)
+    return emb
+
+def get_query_cache_stats():
+    """Hit/miss counters and sizes of the query embedding and result caches"""
+    with query_cache_lock:
+        return dict(query_cache_stats, embeddings_cached=len(query_cache),
+                    results_cached=len(result_cache), index_version=index_version)
+
+def embed_texts(texts, batch_size=EMBED_BATCH_SIZE):
+    """Embed many texts in batches, returning a unit-length float32 (n, EMBED_DIM) matrix"""
+    if not texts:
+        return np.zeros((0, EMBED_DIM), dtype="float32")
+    embeddings = get_embedder().encode(list(texts), batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+    return normalize_vectors(embeddings)
+
+def get_text_hash(text):
+    """Get MD5 hash of a chunk of text for change detection"""
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
 
 def get_file_hash(filepath):
     """Get MD5 hash of file content for change detection"""
@@ -140,6 +374,7 @@ def chunk_content(content, title, filepath):
     if not content.strip():
         return []
     
+    ensure_punkt()
     sentences = sent_tokenize(content)
     chunks = []
     
@@ -153,50 +388,107 @@ def chunk_content(content, title, filepath):
     
     return chunks
 
-def scan_obsidian_folder():
-    """Scan Obsidian folder for new/updated files"""
+def walk_vault_files(folder):
+    """Yield (filepath, stat) for every supported file under folder.
+
+    Uses os.scandir so the stat comes from the directory listing where the
+    OS provides it, and never opens the files themselves.
+    """
+    stack = [folder]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif any(entry.name.endswith(ext) for ext in SUPPORTED_EXTENSIONS):
+                            yield entry.path, entry.stat()
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"Error reading {current}: {e}")
+
+def stat_vault_files(paths):
+    """Yield (filepath, stat) for the given paths that still exist and are supported"""
+    for filepath in paths:
+        if not any(filepath.endswith(ext) for ext in SUPPORTED_EXTENSIONS):
+            continue
+        try:
+            yield filepath, os.stat(filepath)
+        except OSError:
+            continue
+
+def same_stat(entry, current):
+    """True if a registry entry's stat fields match current.
+
+    Inodes are compared only when both are known: on Windows the vault walk
+    (DirEntry.stat) reports 0 while os.stat for watcher paths reports the real one.
+    """
+    if entry.get('modified') != current['modified'] or entry.get('size') != current['size']:
+        return False
+    return not entry.get('inode') or not current['inode'] or entry['inode'] == current['inode']
+
+def scan_obsidian_folder(paths=None):
+    """Scan Obsidian folder for new, updated and deleted files
+
+    With paths, only those files are checked (e.g. from filesystem events)
+    instead of walking the whole vault.
+
+    Change detection is stat-first: a file is only read and hashed when its
+    (mtime, size, inode) differs from the persisted registry, so syncing an
+    idle vault is a directory walk and nothing more.
+
+    Returns (updated_files, deleted_files, current_files). The registry in
+    obsidian_metadata is left untouched; update_obsidian_memory() owns it.
+    """
     if not os.path.exists(OBSIDIAN_FOLDER):
         print(f"Obsidian folder not found: {OBSIDIAN_FOLDER}")
-        return []
+        return [], [], {}
     
     updated_files = []
     current_files = {}
     
     # Scan all supported files
     try:
-        for root, dirs, files in os.walk(OBSIDIAN_FOLDER):
-            for file in files:
-                if any(file.endswith(ext) for ext in SUPPORTED_EXTENSIONS):
-                    filepath = os.path.join(root, file)
-                    file_hash = get_file_hash(filepath)
-                    modified_time = os.path.getmtime(filepath)
-                    
-                    current_files[filepath] = {
-                        'hash': file_hash,
-                        'modified': modified_time
-                    }
-                    
-                    # Check if file is new or modified
-                    if filepath not in obsidian_metadata:
-                        updated_files.append(filepath)
-                        print(f"New file found: {file}")
-                    elif obsidian_metadata[filepath]['hash'] != file_hash:
-                        updated_files.append(filepath)
-                        print(f"Modified file: {file}")
+        candidates = walk_vault_files(OBSIDIAN_FOLDER) if paths is None else stat_vault_files(paths)
+        for filepath, stat in candidates:
+            entry = obsidian_metadata.get(filepath)
+            current = {
+                'modified': stat.st_mtime,
+                'size': stat.st_size,
+                'inode': stat.st_ino
+            }
+            
+            # Unchanged stat - trust the stored hash without reading the file.
+            # Entries without a catalog record are re-parsed once; their chunks are kept.
+            # A None hash marks a file whose embedding failed, so it is always retried.
+            if entry and 'preview' in entry and entry.get('hash') is not None and same_stat(entry, current):
+                current_files[filepath] = dict(current, hash=entry['hash'])
+                continue
+            
+            file_hash = get_file_hash(filepath)
+            current_files[filepath] = dict(current, hash=file_hash)
+            
+            # Check if file is new or modified
+            if entry is None:
+                updated_files.append(filepath)
+                print(f"New file found: {Path(filepath).name}")
+            elif entry['hash'] != file_hash or 'preview' not in entry:
+                updated_files.append(filepath)
+                print(f"Modified file: {Path(filepath).name}")
     except Exception as e:
         print(f"Error scanning Obsidian folder: {e}")
-        return []
+        return [], [], {}
     
     # Check for deleted files
-    deleted_files = set(obsidian_metadata.keys()) - set(current_files.keys())
+    checked = obsidian_metadata if paths is None else [p for p in paths if p in obsidian_metadata]
+    deleted_files = [f for f in checked if f not in current_files]
     for deleted_file in deleted_files:
         print(f"Deleted file: {Path(deleted_file).name}")
     
-    # Update metadata
-    obsidian_metadata.clear()
-    obsidian_metadata.update(current_files)
-    
-    return updated_files
+    return updated_files, deleted_files, current_files
 
 def process_obsidian_file(filepath):
     """Process a single Obsidian file and return chunks"""
@@ -207,48 +499,197 @@ def process_obsidian_file(filepath):
     chunks = chunk_content(parsed['content'], parsed['title'], filepath)
     return chunks
 
-def update_obsidian_memory():
-    """Update memory with latest Obsidian notes"""
-    global memory_texts, index
-    
-    updated_files = scan_obsidian_folder()
-    
-    if not updated_files:
-        return 0
-    
-    # Remove old chunks from updated files (simple approach - rebuild index)
-    # For production, you'd want more sophisticated incremental updates
-    old_memory_texts = memory_texts.copy()
-    memory_texts = []
-    index = faiss.IndexFlatIP(EMBED_DIM)
-    
-    # Re-add non-Obsidian memories
-    for text in old_memory_texts:
-        if not text.startswith("From note '"):
-            add_to_memory(text, save_immediately=False)
+def note_record(parsed, filepath):
+    """Catalog fields of a parsed note: title, frontmatter tags and a content preview"""
+    if not parsed:
+        return {'title': Path(filepath).stem, 'tags': [], 'preview': ''}
+    tags = parsed['metadata'].get('tags') or []
+    if isinstance(tags, str):
+        tags = re.split(r'[,\s]+', tags)
+    content = parsed['content']
+    return {
+        'title': str(parsed['title']),
+        'tags': [str(tag).lstrip('#') for tag in tags if tag],
+        'preview': content[:NOTE_PREVIEW_CHARS] + '...' if len(content) > NOTE_PREVIEW_CHARS else content
+    }
+
+def parse_and_chunk_file(filepath):
+    """Worker entry point: parse and chunk one file, returning (filepath, note record, chunks)"""
+    parsed = parse_obsidian_file(filepath)
+    chunks = chunk_content(parsed['content'], parsed['title'], filepath) if parsed else []
+    return filepath, note_record(parsed, filepath), chunks
+
+def iter_parsed_files(filepaths, workers=None):
+    """Yield (filepath, note record, chunks) for each file, parsing in a process pool when it pays off"""
+    workers = PARSE_WORKERS if workers is None else workers
+    if workers <= 1 or len(filepaths) < PARALLEL_PARSE_MIN_FILES:
+        for filepath in filepaths:
+            yield parse_and_chunk_file(filepath)
+        return
     
-    # Process all files to rebuild Obsidian memory
-    total_chunks = 0
+    chunksize = max(1, len(filepaths) // (workers * 4))
     try:
-        for root, dirs, files in os.walk(OBSIDIAN_FOLDER):
-            for file in files:
-                if any(file.endswith(ext) for ext in SUPPORTED_EXTENSIONS):
-                    filepath = os.path.join(root, file)
-                    chunks = process_obsidian_file(filepath)
-                    for chunk in chunks:
-                        add_to_memory(chunk, save_immediately=False)
-                        total_chunks += 1
+        # spawn, not fork: this process already runs model, watcher and server threads whose
+        # locks a forked child could inherit held
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
     except Exception as e:
-        print(f"Error processing Obsidian files: {e}")
-    
-    # Save everything at once
-    save_memory()
-    save_obsidian_metadata()
-    return total_chunks
+        print(f"⚠️  Parse workers unavailable ({e}) - parsing serially")
+        for filepath in filepaths:
+            yield parse_and_chunk_file(filepath)
+        return
+    with executor:
+        yield from executor.map(parse_and_chunk_file, filepaths, chunksize=chunksize)
+
+def update_obsidian_memory(paths=None):
+    """Incrementally sync memory with the Obsidian vault
+
+    Only chunks of new/modified files are embedded, and only chunks of
+    deleted/modified files are removed. Chunks whose text did not change
+    keep their ids. Pass paths to re-index just those files. Changes go to
+    the memory journal, so a single note edit does not rewrite the store.
+    Returns a report of chunks added/removed/unchanged.
+
+    Scanning, parsing and embedding run under sync_lock only, so retrieval
+    keeps serving while a sync is in progress; memory_lock is taken just to
+    apply the changes to the index and registry and to save them.
+    """
+    with sync_lock:
+        updated_files, deleted_files, current_files = scan_obsidian_folder(paths)
+        updated = set(updated_files)
+        
+        report = {
+            'added': 0,
+            'removed': 0,
+            'unchanged': 0,
+            'files_updated': len(updated_files),
+            'files_deleted': len(deleted_files)
+        }
+        
+        if not updated_files and not deleted_files:
+            # Files whose stat changed but content did not (touched, copied back) only
+            # need their stat refreshed so the next scan skips hashing them
+            if refresh_touched_files(current_files, updated):
+                save_obsidian_metadata()
+            with memory_lock:
+                compact_journal_if_due()
+            report['unchanged'] = sum(len(entry.get('chunk_ids', [])) for entry in obsidian_metadata.values())
+            last_sync_report.clear()
+            last_sync_report.update(report)
+            return report
+        
+        # Re-chunk modified files, keeping chunks whose content is unchanged.
+        # Files are parsed in worker processes while this process embeds full
+        # batches of new chunks as they arrive.
+        pending_files = []
+        stale_ids = []
+        new_chunks = []
+        new_embeddings = []
+        embedded = 0
+        embed_seconds = 0.0
+        try:
+            for filepath, note, chunks in iter_parsed_files(updated_files):
+                entry = obsidian_metadata.get(filepath, {})
+                old_chunks = {}
+                for chunk_hash, chunk_id in zip(entry.get('chunk_hashes', []), entry.get('chunk_ids', [])):
+                    old_chunks.setdefault(chunk_hash, []).append(chunk_id)
+                
+                slots = []  # (chunk_hash, existing id or None, position in new_chunks)
+                for chunk in chunks:
+                    chunk_hash = get_text_hash(chunk)
+                    if old_chunks.get(chunk_hash):
+                        slots.append((chunk_hash, old_chunks[chunk_hash].pop(0), None))
+                        report['unchanged'] += 1
+                    else:
+                        slots.append((chunk_hash, None, len(new_chunks)))
+                        new_chunks.append(chunk)
+                
+                stale_ids.extend(chunk_id for ids in old_chunks.values() for chunk_id in ids)
+                pending_files.append((filepath, note, slots))
+                
+                while len(new_chunks) - embedded >= EMBED_BATCH_SIZE:
+                    start_time = time.time()
+                    new_embeddings.append(embed_texts(new_chunks[embedded:embedded + EMBED_BATCH_SIZE]))
+                    embed_seconds += time.time() - start_time
+                    embedded += EMBED_BATCH_SIZE
+            
+            if embedded < len(new_chunks):
+                start_time = time.time()
+                new_embeddings.append(embed_texts(new_chunks[embedded:]))
+                embed_seconds += time.time() - start_time
+        except Exception as e:
+            print(f"Error processing Obsidian files: {e}")
+        
+        with memory_lock:
+            refresh_touched_files(current_files, updated)
+            
+            # Drop every chunk belonging to a deleted file, and stale chunks of modified files
+            for filepath in deleted_files:
+                entry = obsidian_metadata.pop(filepath)
+                note_catalog.remove(filepath)
+                report['removed'] += remove_from_memory(entry.get('chunk_ids', []), save_immediately=True)
+            report['removed'] += remove_from_memory(stale_ids, save_immediately=True)
+            
+            new_ids = []
+            if new_chunks and sum(len(batch) for batch in new_embeddings) == len(new_chunks):
+                new_ids = add_many_to_memory(new_chunks, save_immediately=True, embeddings=np.vstack(new_embeddings))
+                report['chunks_per_sec'] = round(len(new_ids) / embed_seconds, 1) if embed_seconds > 0 else None
+                print(f"⚡ Embedded {len(new_ids)} chunks in {embed_seconds:.2f} sec ({report['chunks_per_sec']} chunks/sec)")
+            report['added'] = len(new_ids)
+            
+            for filepath, note, slots in pending_files:
+                entry = dict(current_files[filepath])
+                chunk_ids = []
+                chunk_hashes = []
+                for chunk_hash, chunk_id, position in slots:
+                    if chunk_id is None:
+                        if not new_ids:
+                            # Embedding failed - forget the hash so the next sync retries this file
+                            entry['hash'] = None
+                            continue
+                        chunk_id = new_ids[position]
+                    chunk_ids.append(chunk_id)
+                    chunk_hashes.append(chunk_hash)
+                obsidian_metadata[filepath] = dict(entry, chunk_ids=chunk_ids, chunk_hashes=chunk_hashes, **note)
+                note_catalog.add(filepath, obsidian_metadata[filepath])
+            
+            # Chunks of untouched files are unchanged too
+            for filepath, entry in obsidian_metadata.items():
+                if filepath not in updated:
+                    report['unchanged'] += len(entry.get('chunk_ids', []))
+            
+            # The corpus may have grown past an ANN threshold or left an HNSW graph too stale
+            refresh_ann_index()
+            
+            # Changes are already journaled; rewrite the main store only when the journal is due
+            compact_journal_if_due()
+        save_obsidian_metadata()
+        
+        last_sync_report.clear()
+        last_sync_report.update(report)
+        return report
+
+def refresh_touched_files(current_files, updated):
+    """Copy fresh stat fields into registry entries whose content did not change.
+
+    updated is the set of files being re-indexed, which are skipped.
+
+    Returns True if any entry changed.
+    """
+    touched = False
+    with memory_lock:
+        for filepath, current in current_files.items():
+            entry = obsidian_metadata.get(filepath)
+            if entry is not None and filepath not in updated and not same_stat(entry, current):
+                entry.update(current)
+                if 'preview' in entry:
+                    note_catalog.add(filepath, entry)
+                touched = True
+    return touched
 
 def save_obsidian_metadata():
     """Save Obsidian file metadata"""
-    safe_save_json(obsidian_metadata, OBSIDIAN_MEMORY_FILE, backup=False)
+    # Rewritten on every sync and large (chunk ids/hashes per file): compact and unverified, like the memory store
+    safe_save_json(obsidian_metadata, OBSIDIAN_MEMORY_FILE, backup=False, indent=None, verify=False)
 
 def load_obsidian_metadata():
     """Load Obsidian file metadata"""
@@ -259,152 +700,678 @@ def load_obsidian_metadata():
     else:
         obsidian_metadata = {}
 
-def save_memory():
-    """Save memory with error handling"""
+def rebuild_note_catalog():
+    """Index the notes in the registry (entries from before the catalog are re-parsed by the next sync)"""
+    note_catalog.rebuild({filepath: entry for filepath, entry in obsidian_metadata.items() if 'preview' in entry})
+
+def save_vectors(embeddings, filepath):
+    """Atomically write a float32 vector matrix as .npy"""
+    temp_file = filepath + ".tmp"
+    try:
+        with open(temp_file, "wb") as f:
+            np.save(f, np.ascontiguousarray(embeddings, dtype="float32"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, filepath)
+        return True
+    except Exception as e:
+        print(f"❌ Error saving {filepath}: {e}")
+        if os.path.exists(temp_file):
+            try:
+                os.remove(temp_file)
+            except:
+                pass
+        return False
+
+def use_stored_vectors(vectors, ids):
+    """Serve full-precision lookups from vectors (rows in ids order), dropping pending copies.
+
+    Not kept with float32 storage, where the index itself is exact; an open
+    memory map would also stop the file being replaced on Windows.
+    """
+    global stored_vectors, stored_rows
+    if exact_storage():
+        vectors, ids = np.zeros((0, EMBED_DIM), dtype="float32"), []
+    stored_vectors = vectors
+    stored_rows = {chunk_id: row for row, chunk_id in enumerate(ids)}
+    pending_vectors.clear()
+
+def highest_store_generation():
+    """Highest generation of any vector or ANN file on disk.
+
+    New generations are numbered past it, so a save after an unreadable
+    metadata file never overwrites the vectors that file (kept aside) refers to.
+    """
+    generations = [0]
+    for prefix, ext in ((MEMORY_VECTORS_PREFIX, ".npy"), (ANN_INDEX_PREFIX, ".faiss")):
+        for filepath in glob.glob(f"{glob.escape(prefix)}_*{ext}"):
+            suffix = filepath[len(prefix) + 1:-len(ext)]
+            if suffix.isdigit():
+                generations.append(int(suffix))
+    return max(generations)
+
+@with_memory_lock
+def save_memory(force_backup=False):
+    """Save memory as a float32 vector file plus a compact metadata sidecar
+
+    Every save writes a new vector file generation and then atomically
+    swaps the metadata file to point at it, so a crash mid-save leaves the
+    previous store intact. The previous store is backed up at most once per
+    MEMORY_BACKUP_INTERVAL, or always with force_backup.
+    """
+    global last_compaction
     try:
-        embeddings = index.reconstruct_n(0, index.ntotal) if index.ntotal > 0 else []
-        data = {
-            "texts": memory_texts,
-            "embeddings": embeddings.tolist()
+        ids, embeddings = all_vectors()
+        ids = ids.tolist()
+        
+        backup_memory_file(force=force_backup)
+        previous = safe_load_json(MEMORY_META_FILE) or {}
+        generation = max(previous.get("generation", 0), highest_store_generation()) + 1
+        vectors_file = f"{MEMORY_VECTORS_PREFIX}_{generation}.npy"
+        
+        if not save_vectors(embeddings, vectors_file):
+            print("❌ Failed to save memory - check disk space and permissions")
+            return
+        
+        ann_file = None
+        if ann_index is not None:
+            ann_file = f"{ANN_INDEX_PREFIX}_{generation}.faiss"
+            vector_index.save_ann_index(ann_index, ann_file)
+        
+        meta = {
+            "version": MEMORY_STORE_VERSION,
+            "generation": generation,
+            "dim": EMBED_DIM,
+            "count": len(ids),
+            "vectors_file": vectors_file,
+            "ann_file": ann_file,
+            "normalized": True,
+            "next_id": next_memory_id,
+            "ids": ids,
+            "texts": [memory_texts[i] for i in ids]
         }
         
-        if safe_save_json(data, MEMORY_FILE):
+        if safe_save_json(meta, MEMORY_META_FILE, backup=False, indent=None, verify=False):
+            use_stored_vectors(np.load(vectors_file, mmap_mode="r"), ids)
+            for key, new_file in (("vectors_file", vectors_file), ("ann_file", ann_file)):
+                old_file = previous.get(key)
+                if old_file and old_file != new_file and os.path.exists(old_file):
+                    os.remove(old_file)
+            clear_journal()
+            last_compaction = time.time()
             print(f"💾 Saved {len(memory_texts)} memory chunks")
         else:
+            for new_file in (vectors_file, ann_file):
+                if new_file and os.path.exists(new_file):
+                    os.remove(new_file)
             print("❌ Failed to save memory - check disk space and permissions")
     except Exception as e:
         print(f"❌ Error in save_memory: {e}")
 
+def write_journal(records, entries):
+    """Durably append records to the memory journal with a single fsync"""
+    global journal_entries
+    with open(MEMORY_JOURNAL_FILE, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    journal_entries += entries
+
+def append_to_journal(chunk_ids, texts, embeddings):
+    """Durably append inserts to the memory journal"""
+    write_journal(({
+        "id": chunk_id,
+        "text": text,
+        "embedding": base64.b64encode(np.asarray(emb, dtype="float32").tobytes()).decode("ascii")
+    } for chunk_id, text, emb in zip(chunk_ids, texts, embeddings)), len(chunk_ids))
+
+def append_removals_to_journal(chunk_ids):
+    """Durably append removals to the memory journal"""
+    write_journal([{"removed": [int(chunk_id) for chunk_id in chunk_ids]}], len(chunk_ids))
+
+def journal_changes(count, append):
+    """Journal count changes with append(), or rewrite the main store if that makes the journal due (lock held)"""
+    if journal_entries + count >= JOURNAL_COMPACT_THRESHOLD:
+        save_memory()
+    else:
+        append()
+
+def compact_journal_if_due():
+    """Rewrite the main store once the journal has waited JOURNAL_COMPACT_INTERVAL (lock held)"""
+    if journal_entries and time.time() - last_compaction >= JOURNAL_COMPACT_INTERVAL:
+        save_memory()
+
+def replay_journal():
+    """Re-apply journaled inserts and removals that are not in the main store yet"""
+    global next_memory_id, journal_entries
+    journal_entries = 0
+    if not os.path.exists(MEMORY_JOURNAL_FILE):
+        return 0
+    
+    replayed = 0
+    good_lines = []
+    with open(MEMORY_JOURNAL_FILE, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    for line in lines:
+        try:
+            record = json.loads(line)
+            removed = record.get("removed")
+            if removed is None:
+                emb = normalize_vectors(np.frombuffer(base64.b64decode(record["embedding"]), dtype="float32"))[0]
+        except Exception:
+            # A torn final line from a crash mid-append is expected
+            print("⚠️  Skipping unreadable journal entry")
+            continue
+        good_lines.append(line if line.endswith("\n") else line + "\n")
+        if removed is not None:
+            journal_entries += len(removed)
+            replayed += remove_from_memory(removed)
+            continue
+        journal_entries += 1
+        chunk_id = record["id"]
+        if chunk_id in memory_texts:
+            continue
+        index_add(np.expand_dims(emb, axis=0), [chunk_id], [record["text"]])
+        memory_texts[chunk_id] = record["text"]
+        next_memory_id = max(next_memory_id, chunk_id + 1)
+        replayed += 1
+    
+    # Rewrite the journal without damaged entries so later appends start on a clean line
+    if len(good_lines) != len(lines):
+        with open(MEMORY_JOURNAL_FILE, "w", encoding="utf-8") as f:
+            f.writelines(good_lines)
+            f.flush()
+            os.fsync(f.fileno())
+    return replayed
+
+def clear_journal():
+    """Drop the journal once its entries are part of the main store"""
+    global journal_entries
+    if os.path.exists(MEMORY_JOURNAL_FILE):
+        os.remove(MEMORY_JOURNAL_FILE)
+    journal_entries = 0
+
 def add_to_memory(text, save_immediately=True):
-    """Add text to memory with error handling"""
-    try:
-        emb = embed_text(text).astype("float32")
-        index.add(np.expand_dims(emb, axis=0))
-        memory_texts.append(text)
-        
-        if save_immediately:
-            save_memory()
-    except Exception as e:
-        print(f"❌ Error adding to memory: {e}")
+    """Add text to memory with error handling. Returns the new chunk id.
 
-def retrieve_memories(query, top_k=TOP_K_MEMORY):
-    """Retrieve memories with error handling"""
+    With save_immediately the insert is appended to the journal instead of
+    rewriting the whole store; the journal is compacted into the main store
+    every JOURNAL_COMPACT_THRESHOLD entries.
+    """
+    chunk_ids = add_many_to_memory([text], save_immediately=save_immediately)
+    return chunk_ids[0] if chunk_ids else None
+
+def add_many_to_memory(texts, save_immediately=False, batch_size=EMBED_BATCH_SIZE, embeddings=None):
+    """Embed texts in batches and add them with a single index.add call.
+
+    Pass embeddings to skip encoding when they were computed upstream.
+    Encoding runs before memory_lock is taken, so retrieval is not held up by it.
+    Returns the new chunk ids in the same order as texts, or [] on error.
+    """
+    global next_memory_id
+    if not texts:
+        return []
     try:
-        if index.ntotal == 0:
-            return []
-        emb = embed_text(query).astype("float32")
-        emb = np.expand_dims(emb, axis=0)
-        D, I = index.search(emb, top_k)
-        retrieved = [memory_texts[i] for i in I[0] if i < len(memory_texts)]
-        return retrieved
+        if embeddings is None:
+            embeddings = embed_texts(texts, batch_size=batch_size)
+        with memory_lock:
+            chunk_ids = list(range(next_memory_id, next_memory_id + len(texts)))
+            index_add(embeddings, chunk_ids, texts)
+            memory_texts.update(zip(chunk_ids, texts))
+            next_memory_id += len(texts)
+            
+            if save_immediately:
+                journal_changes(len(chunk_ids), lambda: append_to_journal(chunk_ids, texts, embeddings))
+            return chunk_ids
     except Exception as e:
-        print(f"❌ Error retrieving memories: {e}")
+        print(f"❌ Error adding to memory: {e}")
         return []
 
-def get_latest_notes(limit=5):
-    """Get the most recently modified notes"""
-    if not os.path.exists(OBSIDIAN_FOLDER):
-        return []
-    
-    files_with_time = []
+@with_memory_lock
+def remove_from_memory(chunk_ids, save_immediately=False):
+    """Remove chunks by id. Returns the number of chunks removed.
+
+    With save_immediately the removal is journaled like an insert.
+    """
+    chunk_ids = [chunk_id for chunk_id in chunk_ids if chunk_id in memory_texts]
+    if not chunk_ids:
+        return 0
     try:
-        for root, dirs, files in os.walk(OBSIDIAN_FOLDER):
-            for file in files:
-                if any(file.endswith(ext) for ext in SUPPORTED_EXTENSIONS):
-                    filepath = os.path.join(root, file)
-                    try:
-                        modified_time = os.path.getmtime(filepath)
-                        files_with_time.append((filepath, modified_time))
-                    except:
-                        continue
+        index_remove(chunk_ids)
+        for chunk_id in chunk_ids:
+            del memory_texts[chunk_id]
+        if save_immediately:
+            journal_changes(len(chunk_ids), lambda: append_removals_to_journal(chunk_ids))
+        return len(chunk_ids)
     except Exception as e:
-        print(f"Error getting latest notes: {e}")
-        return []
+        print(f"❌ Error removing from memory: {e}")
+        return 0
+
+def exact_storage():
+    """True when the primary index holds full-precision vectors"""
+    return vector_index.storage_name(index) == "float32"
+
+def get_vectors(chunk_ids):
+    """Full-precision vectors for chunk ids, as a float32 matrix"""
+    if len(chunk_ids) == 0:
+        return np.zeros((0, EMBED_DIM), dtype="float32")
+    if exact_storage():
+        return np.vstack([index.reconstruct(int(i)) for i in chunk_ids])
+    chunk_ids = [int(i) for i in chunk_ids]
+    pending = [(j, i) for j, i in enumerate(chunk_ids) if i in pending_vectors]
+    if not pending:
+        return np.asarray(stored_vectors[[stored_rows[i] for i in chunk_ids]], dtype="float32")
+    # Gather the saved rows in one read, then overlay vectors added since the last save
+    vectors = np.empty((len(chunk_ids), EMBED_DIM), dtype="float32")
+    saved = [j for j, i in enumerate(chunk_ids) if i not in pending_vectors]
+    if saved:
+        vectors[saved] = stored_vectors[[stored_rows[chunk_ids[j]] for j in saved]]
+    for j, i in pending:
+        vectors[j] = pending_vectors[i]
+    return vectors
+
+def all_vectors():
+    """(ids, full-precision vectors) of every chunk, in index order"""
+    ids = faiss.vector_to_array(index.id_map) if index.ntotal > 0 else np.zeros(0, dtype="int64")
+    if exact_storage():
+        vectors = index.index.reconstruct_n(0, index.ntotal) if index.ntotal > 0 else np.zeros((0, EMBED_DIM), dtype="float32")
+        return ids, vectors
+    return ids, get_vectors(ids)
+
+def get_lexical_index():
+    """The BM25 index over memory_texts, tokenizing every chunk the first time it is needed (lock held)
+
+    Only hybrid retrieval uses it, so vector-only setups never pay its
+    build time or RAM, and loading the store stays bounded by disk I/O.
+    """
+    global lexical
+    if lexical is None:
+        start_time = time.time()
+        lexical = lexical_index.LexicalIndex()
+        lexical.add_many(memory_texts.items())
+        print(f"🔤 Built BM25 index over {len(lexical)} chunks in {time.time() - start_time:.2f} sec")
+    return lexical
+
+def index_add(embeddings, chunk_ids, texts):
+    """Add vectors to the exact index and the ANN index, if any, and texts to the BM25 index once built"""
+    global index_version
+    index_version += 1
+    if lexical is not None:
+        lexical.add_many(zip(chunk_ids, texts))
+    if not exact_storage():
+        pending_vectors.update(zip(chunk_ids, np.array(embeddings, dtype="float32")))
+    chunk_ids = np.asarray(chunk_ids, dtype="int64")
+    index.add_with_ids(embeddings, chunk_ids)
+    if ann_index is not None:
+        ann_index.add_with_ids(embeddings, chunk_ids)
+
+def index_remove(chunk_ids):
+    """Remove ids from the exact index, the ANN index (if it supports removal) and the BM25 index once built"""
+    global index_version
+    index_version += 1
+    for chunk_id in chunk_ids:
+        if lexical is not None:
+            lexical.remove(chunk_id, memory_texts.get(chunk_id, ""))
+        pending_vectors.pop(chunk_id, None)
+    chunk_ids = np.asarray(chunk_ids, dtype="int64")
+    index.remove_ids(chunk_ids)
+    if ann_index is not None and vector_index.supports_remove(ann_index):
+        ann_index.remove_ids(chunk_ids)
+
+def stale_ann_count():
+    """Removed ids still present in an HNSW graph"""
+    return max(0, ann_index.ntotal - index.ntotal) if ann_index is not None else 0
+
+def refresh_storage_index():
+    """Retrain the primary index as PQ once the corpus is large enough to train it"""
+    global index
+    if VECTOR_STORAGE != "pq" or vector_index.storage_name(index) == "pq" or not vector_index.can_train_pq(index.ntotal):
+        return
+    start_time = time.time()
+    ids, vectors = all_vectors()
+    rebuilt = create_index(vectors)
+    rebuilt.add_with_ids(vectors, ids)
+    index = rebuilt
+    print(f"🗜️  Retrained vector storage as PQ over {index.ntotal} chunks in {time.time() - start_time:.2f} sec")
+
+@with_memory_lock
+def refresh_ann_index(force=False):
+    """(Re)build the ANN index when the configured backend or corpus size calls for it"""
+    global ann_index
+    refresh_storage_index()
+    backend = vector_index.select_backend(INDEX_BACKEND, index.ntotal)
+    if backend == "flat":
+        ann_index = None
+        return
     
-    # Sort by modification time (newest first)
-    files_with_time.sort(key=lambda x: x[1], reverse=True)
+    stale = ann_index is not None and stale_ann_count() > ANN_REBUILD_STALE_RATIO * max(1, ann_index.ntotal)
+    wrong_backend = ann_index is None or (vector_index.ann_backend_name(ann_index) != backend
+                                          and vector_index.can_train_ivfpq(index.ntotal))
+    if not (force or stale or wrong_backend):
+        return
     
-    latest_notes = []
-    for filepath, modified_time in files_with_time[:limit]:
-        parsed = parse_obsidian_file(filepath)
-        if parsed:
-            latest_notes.append({
-                'title': parsed['title'],
-                'filepath': filepath,
-                'modified': datetime.fromtimestamp(modified_time).strftime('%Y-%m-%d %H:%M:%S'),
-                'preview': parsed['content'][:200] + '...' if len(parsed['content']) > 200 else parsed['content']
-            })
+    start_time = time.time()
+    ids, vectors = all_vectors()
+    ann_index = vector_index.build_ann_index(backend, vectors, ids)
+    print(f"🧭 Built {vector_index.ann_backend_name(ann_index)} index over {index.ntotal} chunks "
+          f"in {time.time() - start_time:.2f} sec")
+
+def search_index(emb, top_k):
+    """Search the ANN index if one is active, else the primary index. Returns (scores, ids).
+
+    Lossy indexes (int8/PQ storage, IVF-PQ) over-fetch RESCORE_FACTOR
+    candidates per result and rescore them at full precision.
+    """
+    lossy = not exact_storage() if ann_index is None else vector_index.ann_backend_name(ann_index) == "ivfpq"
+    fetch = top_k * vector_index.RESCORE_FACTOR if lossy else top_k
+    if ann_index is None:
+        D, I = index.search(emb, fetch)
+        D, I = D[0], I[0]
+    else:
+        # Over-fetch past ids that were removed but are still in the HNSW graph
+        D, I = ann_index.search(emb, fetch + stale_ann_count())
+        keep = [j for j, i in enumerate(I[0]) if i in memory_texts]
+        D, I = D[0][keep], I[0][keep]
     
-    return latest_notes
+    if lossy:
+        I = I[I >= 0]
+        return vector_index.rescore(emb[0], I, get_vectors(I), top_k)
+    return D[:top_k], I[:top_k]
 
-def search_notes_by_title(query):
-    """Search notes by title"""
-    if not os.path.exists(OBSIDIAN_FOLDER):
-        return []
+def index_report(k=TOP_K_MEMORY, n_queries=200):
+    """Recall@k and latency of each ANN backend against the flat baseline"""
+    with memory_lock:
+        ids, vectors = all_vectors()
+    return vector_index.evaluate_backends(vectors, ids, k=k, n_queries=n_queries)
+
+def storage_report(k=TOP_K_MEMORY, n_queries=200):
+    """Current vector storage footprint, and footprint/recall@k of every storage type on this corpus"""
+    with memory_lock:
+        ids, vectors = all_vectors()
+        current = {
+            "storage": vector_index.storage_name(index),
+            "vectors": index.ntotal,
+            "bytes_per_vector": vector_index.storage_bytes_per_vector(index),
+            "index_mb": round(vector_index.storage_bytes_per_vector(index) * index.ntotal / (1024 * 1024), 2),
+            "pending_full_precision": len(pending_vectors)
+        }
+    return {"current": current, "storage_types": vector_index.evaluate_storage(vectors, k=k, n_queries=n_queries)}
+
+def memory_source(text):
+    """File name of the note a chunk came from, or "personal" for other memories"""
+    match = re.match(r"From note '.*' \((.+?)\):", text)
+    return match.group(1) if match else "personal"
+
+def retrieve_memories(query, top_k=TOP_K_MEMORY, timings=None):
+    """Retrieve memories with error handling
+
+    Returns up to top_k RetrievedMemory(text, score, source) tuples, best
+    first; score is the cosine similarity to the query. Chunks below
+    MIN_MEMORY_SIMILARITY are dropped unless they matched a rare query term
+    (MIN_KEYWORD_SCORE), so an irrelevant query retrieves nothing.
+
+    In hybrid mode the vector and BM25 rankings are fused by reciprocal
+    rank, so exact names the embedding misses still surface. With
+    RERANK_ENABLED, RERANK_CANDIDATES are over-fetched and reordered by the
+    cross-encoder, keeping only those scoring at least RERANK_MIN_SCORE.
+    Pass a dict as timings to get per-stage latency in milliseconds.
+    """
+    timings = {} if timings is None else timings
+    start_time = time.perf_counter()
     
-    matching_notes = []
-    query_lower = query.lower()
+    def lap(stage, since):
+        now = time.perf_counter()
+        timings[stage] = round((now - since) * 1000, 3)
+        return now
     
     try:
-        for root, dirs, files in os.walk(OBSIDIAN_FOLDER):
-            for file in files:
-                if any(file.endswith(ext) for ext in SUPPORTED_EXTENSIONS):
-                    filepath = os.path.join(root, file)
-                    parsed = parse_obsidian_file(filepath)
-                    if parsed and query_lower in parsed['title'].lower():
-                        matching_notes.append({
-                            'title': parsed['title'],
-                            'filepath': filepath,
-                            'content': parsed['content']
-                        })
+        if index.ntotal == 0:
+            return []
+        key = (normalize_query(query), top_k, index_version)
+        cached = cache_get(result_cache, key, "result_")
+        timings["cache_hit"] = cached is not None
+        if cached is not None:
+            with memory_lock:
+                return [RetrievedMemory(memory_texts[i], score, memory_source(memory_texts[i]))
+                        for i, score in cached if i in memory_texts]
+        
+        hybrid = RETRIEVAL_MODE == "hybrid"
+        keep = max(top_k, RERANK_CANDIDATES) if RERANK_ENABLED else top_k
+        candidates = max(keep, HYBRID_CANDIDATES) if hybrid else keep
+        stage_time = start_time
+        emb = np.expand_dims(embed_query(query), axis=0)
+        stage_time = lap("embed_ms", stage_time)
+        with memory_lock:
+            D, I = search_index(emb, candidates)
+            vector_ids = [int(i) for i in I if i in memory_texts]
+            stage_time = lap("vector_ms", stage_time)
+            lexical_hits = []
+            if hybrid:
+                lexical_hits = get_lexical_index().search(query, candidates)
+                lexical_ids = [i for i, _ in lexical_hits]
+                stage_time = lap("lexical_ms", stage_time)
+                ids = lexical_index.rrf_fuse([vector_ids, lexical_ids], keep)
+                stage_time = lap("fusion_ms", stage_time)
+            else:
+                ids = vector_ids[:keep]
+            retrieved = [memory_texts[i] for i in ids]
+            # Exact similarity for every candidate, including keyword-only hits the vector search did not score
+            similarities = (get_vectors(ids) @ emb[0]).tolist()
+        
+        results = list(zip(ids, retrieved, similarities))
+        cacheable = True
+        reranked = False
+        if RERANK_ENABLED:
+            scores = rerank_scores(query, retrieved)
+            lap("rerank_ms", stage_time)
+            reranked = scores is not None
+            timings["reranked"] = reranked
+            if reranked:
+                order = sorted(range(len(results)), key=lambda j: scores[j], reverse=True)
+                results = [results[j] for j in order if scores[j] >= RERANK_MIN_SCORE]
+            else:
+                # Over budget (or no model): fall back to retrieval order, and retry next time
+                cacheable = False
+        
+        # The reranker has already judged relevance; otherwise cut weak vector-only matches
+        if not reranked:
+            keyword_hits = {i for i, score in lexical_hits if score >= MIN_KEYWORD_SCORE}
+            results = [r for r in results if r[2] >= MIN_MEMORY_SIMILARITY or r[0] in keyword_hits]
+        results = results[:top_k]
+        
+        if cacheable:
+            cache_put(result_cache, key, [(i, round(score, 4)) for i, _, score in results])
+        return [RetrievedMemory(text, round(score, 4), memory_source(text)) for _, text, score in results]
     except Exception as e:
-        print(f"Error searching notes: {e}")
+        print(f"❌ Error retrieving memories: {e}")
+        return []
+    finally:
+        lap("total_ms", start_time)
+
+def get_latest_notes(limit=5):
+    """Get the most recently modified notes from the note catalog"""
+    latest_notes = []
+    for filepath, entry in note_catalog.latest(limit):
+        preview = entry['preview']
+        latest_notes.append({
+            'title': entry['title'],
+            'filepath': filepath,
+            'modified': datetime.fromtimestamp(entry['modified']).strftime('%Y-%m-%d %H:%M:%S'),
+            'tags': entry['tags'],
+            'preview': preview[:200] + '...' if len(preview) > 200 else preview
+        })
+    return latest_notes
+
+def search_notes_by_title(query, limit=None):
+    """Search notes by title in the note catalog
+
+    Titles starting with the query come first, then titles containing it,
+    then titles sharing terms with it. Each result carries the catalog
+    preview, not the full note text.
+    """
+    return [{
+        'title': entry['title'],
+        'filepath': filepath,
+        'tags': entry['tags'],
+        'preview': entry['preview']
+    } for filepath, entry in note_catalog.search(query, limit)]
+
+def load_store_files():
+    """Load (ids, texts, embeddings, next_id, ann_file, normalized) from the binary store
+
+    The vector file is memory-mapped, so load time is bounded by disk I/O
+    rather than JSON float parsing. Returns None if there is no store.
+    """
+    meta = safe_load_json(MEMORY_META_FILE)
+    if meta is None:
+        return None
+    if meta.get("version") != MEMORY_STORE_VERSION:
+        raise ValueError(f"unsupported memory store version {meta.get('version')}")
     
-    return matching_notes
+    ids = meta.get("ids", [])
+    texts = meta.get("texts", [])
+    embeddings = np.load(meta["vectors_file"], mmap_mode="r")
+    if embeddings.shape != (meta["count"], meta["dim"]) or len(ids) != len(texts) or len(ids) != meta["count"]:
+        raise ValueError(f"memory store is inconsistent ({meta['vectors_file']} has shape {embeddings.shape}, "
+                         f"metadata lists {len(ids)} chunks)")
+    return ids, texts, embeddings, meta.get("next_id"), meta.get("ann_file"), meta.get("normalized", False)
 
+def load_legacy_memory_file():
+    """Load (ids, texts, embeddings, next_id, ann_file, normalized) from the old memory_store.json"""
+    data = safe_load_json(MEMORY_FILE)
+    if data is None:
+        return None
+    texts = data.get("texts", [])
+    ids = data.get("ids", list(range(len(texts))))
+    embeddings = np.array(data.get("embeddings", []), dtype="float32").reshape(-1, EMBED_DIM)
+    return ids, texts, embeddings, None, None, False
+
+@with_memory_lock
 def load_memory():
     """Load memory with error handling and recovery"""
-    global memory_texts, index
+    global memory_texts, index, ann_index, lexical, next_memory_id, index_version
     
     load_obsidian_metadata()
+    rebuild_note_catalog()
+    index_version += 1
     
-    data = safe_load_json(MEMORY_FILE)
-    
-    if data is None:
-        print("⚠️  No valid memory file found - starting fresh")
-        memory_texts = []
-        index = faiss.IndexFlatIP(EMBED_DIM)
-        return
+    memory_texts = {}
+    index = create_index()
+    ann_index = None
+    lexical = None
+    next_memory_id = 0
+    use_stored_vectors(np.zeros((0, EMBED_DIM), dtype="float32"), [])
     
     try:
-        memory_texts = data.get("texts", [])
-        embeddings_data = data.get("embeddings", [])
+        migrating = not os.path.exists(MEMORY_META_FILE) and os.path.exists(MEMORY_FILE)
+        data = load_legacy_memory_file() if migrating else load_store_files()
+        renormalizing = False
         
-        if embeddings_data:
-            embeddings = np.array(embeddings_data).astype("float32")
+        if data is None:
+            if not migrating and os.path.exists(MEMORY_META_FILE):
+                backup_memory_file(force=True)
+            print("⚠️  No valid memory file found - starting fresh")
+        else:
+            ids, texts, embeddings, next_id, ann_file, normalized = data
+            
+            # Stores written before embeddings were normalized: renormalize once
+            # (the next save records it) and drop the ANN index built on raw vectors
+            if not normalized and len(embeddings) > 0:
+                renormalizing = True
+                report = vector_index.evaluate_normalization(embeddings)
+                print(f"🔄 Normalizing {len(embeddings)} stored vectors (norms {report['norm_min']}-{report['norm_max']}); "
+                      f"self-retrieval@1 {report['before']['self_hit_at_1']} -> {report['after']['self_hit_at_1']}")
+                embeddings = normalize_vectors(embeddings)
+                ann_file = None
+            
             if len(embeddings) > 0:
-                index.add(embeddings)
+                index = create_index(embeddings)
+                index.add_with_ids(np.ascontiguousarray(embeddings, dtype="float32"), np.array(ids, dtype="int64"))
+                use_stored_vectors(embeddings, ids)
+            
+            memory_texts = dict(zip(ids, texts))
+            next_memory_id = next_id if next_id is not None else (max(ids) + 1 if ids else 0)
+            
+            # Reuse the trained ANN index saved alongside these vectors
+            if ann_file and os.path.exists(ann_file):
+                try:
+                    ann_index = vector_index.load_ann_index(ann_file)
+                except Exception as e:
+                    print(f"⚠️  Could not load {ann_file} ({e}) - rebuilding")
+        
+        replayed = replay_journal()
+        if replayed:
+            print(f"📜 Replayed {replayed} journaled memory chunks")
+        
+        refresh_ann_index()
+        
+        # Stores written before the chunk registry existed cannot be synced
+        # incrementally - drop their Obsidian chunks so the next sync re-adds them once
+        if any('chunk_ids' not in entry for entry in obsidian_metadata.values()):
+            print("🔄 Migrating Obsidian chunks to the per-file registry")
+            remove_from_memory([i for i, text in memory_texts.items() if text.startswith("From note '")])
+            obsidian_metadata.clear()
+            rebuild_note_catalog()
+        
+        # A registry entry whose chunks are missing from the store (lost or unreadable
+        # store) would be trusted by the stat-first scan and never re-embedded, and its
+        # ids may be reused by new chunks - forget it so the next sync re-adds the note
+        lost_files = [filepath for filepath, entry in obsidian_metadata.items()
+                      if any(chunk_id not in memory_texts for chunk_id in entry.get('chunk_ids', []))]
+        if lost_files:
+            print(f"🔄 Re-indexing {len(lost_files)} notes whose chunks are missing from the memory store")
+            for filepath in lost_files:
+                remove_from_memory(obsidian_metadata.pop(filepath)['chunk_ids'])
+            rebuild_note_catalog()
+        
+        # Migrate the JSON store / raw vectors once, and compact a journal that outgrew its threshold
+        if migrating or renormalizing or journal_entries >= JOURNAL_COMPACT_THRESHOLD:
+            if migrating:
+                print(f"🔄 Migrating {MEMORY_FILE} to the binary memory store")
+            save_memory(force_backup=migrating or renormalizing)
+            if migrating and os.path.exists(MEMORY_META_FILE):
+                os.replace(MEMORY_FILE, MEMORY_FILE + ".migrated")
         
         print(f"✅ Loaded {len(memory_texts)} memory chunks")
     
     except Exception as e:
         print(f"❌ Error loading memory: {e}")
+        # Keep the store that failed to load - the next save would replace it
+        try:
+            backup_memory_file(force=True)
+        except Exception as backup_error:
+            print(f"❌ Error backing up memory: {backup_error}")
         print("⚠️  Starting with fresh memory")
-        memory_texts = []
-        index = faiss.IndexFlatIP(EMBED_DIM)
+        memory_texts = {}
+        index = create_index()
+        ann_index = None
+        lexical = None
+        next_memory_id = 0
+        # None of the registry's chunks survived - re-index the whole vault on the next sync
+        obsidian_metadata.clear()
+        rebuild_note_catalog()
+
+def personal_seed_chunks():
+    """Chunks of the personal profile, in a fixed order (pinned into every prompt)"""
+    global pinned_memories
+    if pinned_memories is None:
+        try:
+            ensure_punkt()
+            sentences = sent_tokenize(PERSONAL_PROFILE)
+        except Exception as e:
+            print(f"❌ Error chunking personal profile: {e}")
+            sentences = []
+        chunk_size = 5
+        pinned_memories = [' '.join(sentences[i:i+chunk_size]) for i in range(0, len(sentences), chunk_size)]
+    return pinned_memories
 
 def seed_personal_memory():
     """Seed with personal information"""
-    large_text = '''I am Arun Prakash S, a passionate AI researcher specializing in Natural Language Processing, Named Entity Recognition, Natural Language Generation, and Quantum Computing. I work on cutting-edge AI projects and research.'''
-    
-    sentences = sent_tokenize(large_text)
-    chunk_size = 5
-    chunks = [' '.join(sentences[i:i+chunk_size]) for i in range(0, len(sentences), chunk_size)]
-    count = 0
-    for chunk in chunks:
-        if chunk not in memory_texts:
-            add_to_memory(chunk, save_immediately=False)
-            count += 1
+    chunks = personal_seed_chunks()
+    existing = set(memory_texts.values())
+    new_chunks = [chunk for chunk in chunks if chunk not in existing]
+    count = len(add_many_to_memory(new_chunks))
     
     if count > 0:
         save_memory()
@@ -413,12 +1380,14 @@ def seed_personal_memory():
 def initialize_obsidian_memory():
     """Initialize Obsidian memory on first run"""
     print("🔄 Initializing Obsidian memory...")
-    chunks_added = update_obsidian_memory()
-    print(f"✅ Added {chunks_added} chunks from Obsidian notes")
-
-def sync_obsidian_memory():
-    """Sync Obsidian memory with latest changes"""
-    chunks_added = update_obsidian_memory()
-    if chunks_added > 0:
-        print(f"🔄 Synced {chunks_added} chunks from Obsidian")
-    return chunks_added
\ No newline at end of file
+    report = update_obsidian_memory()
+    print(f"✅ Added {report['added']} chunks from Obsidian notes "
+          f"({report['removed']} removed, {report['unchanged']} unchanged)")
+
+def sync_obsidian_memory(paths=None):
+    """Sync Obsidian memory with latest changes, optionally for just the given paths"""
+    report = update_obsidian_memory(paths)
+    if report['added'] > 0 or report['removed'] > 0:
+        print(f"🔄 Synced Obsidian: {report['added']} chunks added, "
+              f"{report['removed']} removed, {report['unchanged']} unchanged")
+    return report['added']
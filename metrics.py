@@ -0,0 +1,145 @@
+"""
+Request telemetry for the API, exported in the Prometheus text format.
+
+Every chat request is timed by stage - queue wait, query embedding, vector
+and keyword search, prompt build, KV state restore, prompt evaluation,
+time to first token, generation - and each stage is observed into a
+latency histogram, along with generation speed and token counters. GET
+/metrics renders them all; histograms are cumulative since server start,
+so Prometheus (or a diff of two scrapes) gives rates and percentiles.
+"""
+import bisect
+import threading
+
+METRIC_PREFIX = "shendu"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)  # seconds
+TOKENS_PER_SEC_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200)
+
+# Keys of memory.retrieve_memories() timings -> stage label
+RETRIEVAL_STAGES = {
+    "embed_ms": "embed",
+    "vector_ms": "vector_search",
+    "lexical_ms": "lexical_search",
+    "fusion_ms": "fusion",
+    "rerank_ms": "rerank",
+    "total_ms": "retrieval"
+}
+
+HELP = {
+    "stage_latency_seconds": "Latency of each stage of a chat request",
+    "generation_tokens_per_second": "Generation speed after the first token, per request",
+    "chat_requests_total": "Chat requests by endpoint and outcome",
+    "completion_tokens_total": "Tokens generated",
+    "prompt_tokens_evaluated_total": "Prompt tokens evaluated by the model",
+    "prompt_tokens_reused_total": "Prompt tokens reused from the KV cache",
+    "queue_depth": "Requests waiting for an inference slot",
+    "busy_slots": "Inference slots running a request",
+    "inference_slots": "Inference slots loaded"
+}
+
+
+class Histogram:
+    """Fixed-bucket histogram; counts are kept per bucket and summed on render"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last: above the largest bucket
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    """Histograms, counters and gauges keyed by name and label values"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.counters = {}  # (name, labels) -> value
+        self.gauges = {}
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for kind, items in (("histogram", self.histograms), ("counter", self.counters), ("gauge", self.gauges)):
+                families = {}
+                for (name, labels), value in items.items():
+                    families.setdefault(name, []).append((labels, value))
+                for name in sorted(families):
+                    metric = f"{METRIC_PREFIX}_{name}"
+                    lines.append(f"# HELP {metric} {HELP.get(name, name)}")
+                    lines.append(f"# TYPE {metric} {kind}")
+                    for labels, value in sorted(families[name]):
+                        if kind == "histogram":
+                            lines.extend(render_histogram(metric, labels, value))
+                        else:
+                            lines.append(f"{metric}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+def render_histogram(metric, labels, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f"{metric}_bucket{format_labels(labels, le=bound)} {cumulative}")
+    lines.append(f"{metric}_bucket{format_labels(labels, le='+Inf')} {histogram.count}")
+    lines.append(f"{metric}_sum{format_labels(labels)} {round(histogram.sum, 6)}")
+    lines.append(f"{metric}_count{format_labels(labels)} {histogram.count}")
+    return lines
+
+
+registry = MetricsRegistry()
+
+
+def observe_stage(stage, ms):
+    """Record one stage latency given in milliseconds"""
+    if ms is not None:
+        registry.observe("stage_latency_seconds", ms / 1000, stage=stage)
+
+
+def record_chat(endpoint, timings, retrieval=None, usage=None):
+    """Record a finished chat request: its stage timings (ms), retrieval timings and token usage"""
+    for key, stage in RETRIEVAL_STAGES.items():
+        if retrieval and key in retrieval:
+            observe_stage(stage, retrieval[key])
+    for key, value in timings.items():
+        if key == "tokens_per_sec":
+            if value:
+                registry.observe("generation_tokens_per_second", value, buckets=TOKENS_PER_SEC_BUCKETS)
+        elif key.endswith("_ms"):
+            observe_stage(key[:-3], value)
+    usage = usage or {}
+    registry.increment("completion_tokens_total", usage.get("completion_tokens") or 0)
+    registry.increment("prompt_tokens_evaluated_total", usage.get("prompt_tokens_evaluated") or 0)
+    registry.increment("prompt_tokens_reused_total", usage.get("prompt_tokens_reused") or 0)
+    registry.increment("chat_requests_total", endpoint=endpoint, outcome="ok")
@@ -0,0 +1,86 @@
+"""
+In-memory catalog of vault notes for title lookup and recency listing.
+
+The sync registry (obsidian_memory.json) is the persistent record: for each
+note it stores title, frontmatter tags, mtime, size and a content preview,
+written by update_obsidian_memory() whenever a note is parsed. This module
+keeps that data indexed so search_notes_by_title() and get_latest_notes()
+answer without touching the vault:
+
+  titles  - sorted (lowercase title, path) pairs, bisected for prefix lookup
+  recent  - (-mtime, path) pairs, already in newest-first order
+  terms   - BM25 over title terms, for matches that are not a prefix
+"""
+import bisect
+import threading
+
+import lexical_index
+
+
+class NoteCatalog:
+    """Title and recency indexes over the note records of the sync registry"""
+
+    def __init__(self):
+        self.notes = {}  # path -> registry entry (title, tags, modified, size, preview, ...)
+        self.titles = []
+        self.recent = []
+        self.terms = lexical_index.LexicalIndex()
+        self.lock = threading.Lock()  # held only briefly, so lookups never wait for a sync
+
+    def __len__(self):
+        return len(self.notes)
+
+    def rebuild(self, entries):
+        """Replace the catalog with the given {path: entry} records"""
+        with self.lock:
+            self.notes = {path: dict(entry) for path, entry in entries.items()}
+            self.titles = sorted((entry['title'].lower(), path) for path, entry in self.notes.items())
+            self.recent = sorted((-entry['modified'], path) for path, entry in self.notes.items())
+            self.terms = lexical_index.LexicalIndex()
+            self.terms.add_many((path, entry['title']) for path, entry in self.notes.items())
+
+    def add(self, path, entry):
+        """Add or replace the record for path"""
+        with self.lock:
+            self._discard(path)
+            entry = dict(entry)  # registry entries are updated in place; keep the indexed values
+            self.notes[path] = entry
+            bisect.insort(self.titles, (entry['title'].lower(), path))
+            bisect.insort(self.recent, (-entry['modified'], path))
+            self.terms.add(path, entry['title'])
+
+    def remove(self, path):
+        with self.lock:
+            self._discard(path)
+
+    def _discard(self, path):
+        entry = self.notes.pop(path, None)
+        if entry is None:
+            return
+        for items, key in ((self.titles, (entry['title'].lower(), path)), (self.recent, (-entry['modified'], path))):
+            i = bisect.bisect_left(items, key)
+            if i < len(items) and items[i] == key:
+                del items[i]
+        self.terms.remove(path, entry['title'])
+
+    def search(self, query, limit=None):
+        """Paths of notes whose title starts with query, then contains it, then shares terms with it"""
+        query = query.strip().lower()
+        if not query:
+            return []
+        with self.lock:
+            matches = []
+            i = bisect.bisect_left(self.titles, (query,))
+            while i < len(self.titles) and self.titles[i][0].startswith(query):
+                matches.append(self.titles[i][1])
+                i += 1
+            seen = set(matches)
+            matches += [path for title, path in self.titles if path not in seen and query in title]
+            seen.update(matches)
+            matches += [path for path, _ in self.terms.search(query, len(self.notes)) if path not in seen]
+            return [(path, self.notes[path]) for path in matches[:limit]]
+
+    def latest(self, limit):
+        """(path, entry) of the most recently modified notes, newest first"""
+        with self.lock:
+            return [(path, self.notes[path]) for _, path in self.recent[:limit]]
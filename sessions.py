@@ -0,0 +1,151 @@
+"""
+Server-side chat sessions with llama.cpp KV-cache reuse.
+
+Each session keeps its conversation history and the llama.cpp state saved
+after its last turn. Before a turn the state is restored into the model (if
+another session used the context in between), so llama.cpp only evaluates
+the tokens past the longest common prefix - the new user turn - instead of
+the system prompt and all prior turns.
+
+Saved states are the RAM-heavy part: when their total exceeds
+SESSION_RAM_BUDGET_MB, states of the least recently used sessions are
+dropped (their history is kept and the next turn re-evaluates it). Sessions
+idle for SESSION_IDLE_TIMEOUT are removed entirely.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+SESSION_RAM_BUDGET_MB = 2048  # total size of saved llama.cpp states
+SESSION_IDLE_TIMEOUT = 3600  # seconds before an idle session is dropped
+MAX_SESSION_ID_LENGTH = 128
+
+
+class Session:
+    def __init__(self, session_id):
+        self.id = session_id
+        self.history = []
+        self.state = None  # llama_cpp.LlamaState after the last turn
+        self.state_bytes = 0
+        self.last_used = time.time()
+        self.turns = 0
+        self.lock = threading.Lock()  # held for a whole turn, so two slots never run the same session
+
+
+class SessionStore:
+    """LRU store of sessions with a RAM budget for their saved model states"""
+
+    def __init__(self, ram_budget_mb=SESSION_RAM_BUDGET_MB, idle_timeout=SESSION_IDLE_TIMEOUT):
+        self.ram_budget = ram_budget_mb * 1024 * 1024
+        self.idle_timeout = idle_timeout
+        self.sessions = OrderedDict()
+        self.context_owner = {}  # id(llm) -> session id whose tokens are in that model's context
+        self.lock = threading.Lock()
+        self.evicted_states = 0
+        self.expired_sessions = 0
+
+    def get(self, session_id, history=None):
+        """Return the session, creating it (seeded with history) if it does not exist"""
+        if not session_id or len(session_id) > MAX_SESSION_ID_LENGTH:
+            raise ValueError("session_id must be 1-128 characters")
+        with self.lock:
+            self.expire_idle()
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = Session(session_id)
+                session.history = list(history or [])
+                self.sessions[session_id] = session
+            self.sessions.move_to_end(session_id)
+            session.last_used = time.time()
+            return session
+
+    def reset(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+            self.release_contexts(session_id)
+
+    def release_contexts(self, session_id):
+        """Forget that any model context holds session_id's tokens (lock held)"""
+        for llm_id, owner in list(self.context_owner.items()):
+            if owner == session_id:
+                del self.context_owner[llm_id]
+
+    def restore(self, llm, session):
+        """Load the session's KV state into llm unless it is already there.
+
+        Returns the tokens in the model context before the turn, used to
+        measure how much of the next prompt is reused.
+        """
+        with self.lock:
+            owner = self.context_owner.get(id(llm))
+        if session is not None and owner != session.id and session.state is not None:
+            llm.load_state(session.state)
+            # The context now holds this session, even if the turn never reaches checkpoint()
+            with self.lock:
+                self.context_owner[id(llm)] = session.id
+        return list(llm.input_ids[:llm.n_tokens])
+
+    def checkpoint(self, llm, session, context_before, prompt_tokens):
+        """Save the session's KV state after a turn and report prompt token reuse.
+
+        prefix_reuse_ratio is the share of the prompt llama.cpp found already
+        evaluated in its context (the common prefix with the previous turn).
+        """
+        context_after = list(llm.input_ids[:llm.n_tokens])
+        prompt = context_after[:prompt_tokens]
+        reused = 0
+        for before, now in zip(context_before, prompt):
+            if before != now:
+                break
+            reused += 1
+
+        with self.lock:
+            if session is not None:
+                # Other slots holding an older turn of this session must load the new state
+                self.release_contexts(session.id)
+            self.context_owner[id(llm)] = session.id if session is not None else None
+        if session is not None:
+            state = llm.save_state()
+            with self.lock:
+                session.state = state
+                session.state_bytes = getattr(state, "llama_state_size", 0)
+                session.turns += 1
+                self.enforce_budget()
+
+        return {
+            "prompt_tokens": len(prompt),
+            "prompt_tokens_reused": reused,
+            "prompt_tokens_evaluated": len(prompt) - reused,
+            "prefix_reuse_ratio": round(reused / len(prompt), 3) if prompt else 0.0
+        }
+
+    def enforce_budget(self):
+        """Drop saved states, least recently used first, until under the RAM budget (lock held)"""
+        total = sum(s.state_bytes for s in self.sessions.values())
+        for session in self.sessions.values():
+            if total <= self.ram_budget:
+                break
+            if session.state is not None:
+                total -= session.state_bytes
+                session.state = None
+                session.state_bytes = 0
+                self.evicted_states += 1
+
+    def expire_idle(self):
+        """Remove sessions idle longer than idle_timeout (lock held)"""
+        cutoff = time.time() - self.idle_timeout
+        for session_id in [sid for sid, s in self.sessions.items() if s.last_used < cutoff]:
+            del self.sessions[session_id]
+            self.release_contexts(session_id)
+            self.expired_sessions += 1
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "sessions": len(self.sessions),
+                "sessions_with_state": sum(1 for s in self.sessions.values() if s.state is not None),
+                "state_mb": round(sum(s.state_bytes for s in self.sessions.values()) / (1024 * 1024), 1),
+                "ram_budget_mb": round(self.ram_budget / (1024 * 1024), 1),
+                "evicted_states": self.evicted_states,
+                "expired_sessions": self.expired_sessions
+            }
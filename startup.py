@@ -0,0 +1,86 @@
+"""
+Background loading of the API's heavy components.
+
+Loading the llama.cpp model, the sentence embedder and the memory store takes
+tens of seconds, so api.py starts them on daemon threads when the server
+starts instead of at import. The server answers lightweight endpoints
+(/ready, /system-stats, ...) right away; endpoints that need a component
+wait briefly for it and answer 503 while it is still loading.
+
+Each component is pending -> loading -> ready | failed, with its load time
+and error, as reported by /ready.
+"""
+import threading
+import time
+
+
+class ComponentLoader:
+    """Load named components on background threads and track their state"""
+
+    def __init__(self):
+        self.components = {}  # name -> {"state", "load_ms", "error"}
+        self.done = {}  # name -> threading.Event, set once ready or failed
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def start(self, name, load):
+        """Run load() on a daemon thread"""
+        with self.lock:
+            self.components[name] = {"state": "pending", "load_ms": None, "error": None}
+            self.done[name] = threading.Event()
+        threading.Thread(target=self.run, args=(name, load), daemon=True).start()
+
+    def run(self, name, load):
+        self.set_state(name, "loading")
+        start_time = time.perf_counter()
+        try:
+            load()
+        except Exception as e:
+            print(f"❌ Failed to load {name}: {e}")
+            self.finish(name, "failed", start_time, str(e))
+            return
+        self.finish(name, "ready", start_time)
+        print(f"✅ {name} ready in {self.components[name]['load_ms'] / 1000:.1f}s")
+
+    def set_state(self, name, state):
+        with self.lock:
+            self.components[name]["state"] = state
+
+    def finish(self, name, state, start_time, error=None):
+        with self.lock:
+            self.components[name].update(
+                state=state,
+                load_ms=round((time.perf_counter() - start_time) * 1000, 1),
+                error=error
+            )
+        self.done[name].set()
+
+    def is_ready(self, *names):
+        with self.lock:
+            return all(self.components.get(name, {}).get("state") == "ready" for name in names)
+
+    def wait(self, names, timeout=None):
+        """Block until the named components finished loading (or timeout). Returns True if all are ready."""
+        deadline = None if timeout is None else time.time() + timeout
+        for name in names:
+            event = self.done.get(name)
+            if event is None:
+                return False
+            if not event.wait(None if deadline is None else max(0.0, deadline - time.time())):
+                return False
+        return self.is_ready(*names)
+
+    def not_ready(self, names):
+        """The named components that are not ready yet, with their state"""
+        with self.lock:
+            return {name: self.components.get(name, {}).get("state", "not started")
+                    for name in names if self.components.get(name, {}).get("state") != "ready"}
+
+    def get_status(self):
+        with self.lock:
+            components = {name: dict(info) for name, info in self.components.items()}
+        return {
+            "ready": bool(components) and all(info["state"] == "ready" for info in components.values()),
+            "uptime_s": round(time.time() - self.started, 1),
+            "components": components
+        }
@@ -0,0 +1,116 @@
+"""
+Background sampler for host metrics (CPU, memory, disk, network, temperature).
+
+psutil.cpu_percent(interval=1) blocks for the whole interval, and
+sensors_temperatures() can take tens of milliseconds, so the API does not
+call them per request. A daemon thread samples every SAMPLE_INTERVAL seconds
+into a ring buffer instead: /system-stats returns the latest sample and
+/system-stats/history the buffered time series.
+
+CPU usage is measured non-blocking, over the time since the previous
+sample; network rates are likewise the byte deltas between samples.
+"""
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import psutil
+
+SAMPLE_INTERVAL = 2.0  # seconds between samples
+HISTORY_SIZE = 900  # samples kept (30 minutes at the default interval)
+TEMPERATURE_INTERVAL = 30.0  # seconds between sensor reads, the slowest probe
+DISK_PATH = '/'
+
+
+def read_temperature():
+    """First reported sensor temperature, or None where unsupported"""
+    try:
+        if hasattr(psutil, "sensors_temperatures"):
+            temps = psutil.sensors_temperatures()
+            if temps:
+                return list(temps.values())[0][0].current
+    except Exception:
+        pass
+    return None
+
+
+class SystemMonitor:
+    """Sample host metrics on a background thread into a fixed-size ring buffer"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL, history_size=HISTORY_SIZE):
+        self.interval = interval
+        self.samples = deque(maxlen=history_size)
+        self.lock = threading.Lock()
+        self.start_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.temperature = None
+        self.temperature_read = 0.0
+
+    def start(self):
+        with self.start_lock:
+            if self.thread is not None:
+                return
+            psutil.cpu_percent(interval=None)  # prime: the first non-blocking call has no baseline
+            self.sample()
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"System stats sampling error: {e}")
+
+    def sample(self):
+        """Take one sample and append it to the buffer"""
+        now = time.time()
+        memory = psutil.virtual_memory()
+        network = psutil.net_io_counters()
+        if now - self.temperature_read >= TEMPERATURE_INTERVAL:
+            self.temperature = read_temperature()
+            self.temperature_read = now
+        sample = {
+            "time": now,
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "memory_percent": memory.percent,
+            "memory_available_mb": round(memory.available / (1024 * 1024), 1),
+            "disk_percent": psutil.disk_usage(DISK_PATH).percent,
+            "network_io": {
+                "bytes_sent": network.bytes_sent,
+                "bytes_recv": network.bytes_recv
+            },
+            "network_rate": None,
+            "temperature": self.temperature,
+            "timestamp": datetime.fromtimestamp(now).isoformat()
+        }
+        with self.lock:
+            previous = self.samples[-1] if self.samples else None
+            if previous is not None and now > previous["time"]:
+                elapsed = now - previous["time"]
+                sample["network_rate"] = {
+                    "sent_per_sec": round((network.bytes_sent - previous["network_io"]["bytes_sent"]) / elapsed, 1),
+                    "recv_per_sec": round((network.bytes_recv - previous["network_io"]["bytes_recv"]) / elapsed, 1)
+                }
+            self.samples.append(sample)
+        return sample
+
+    def latest(self):
+        """Most recent sample, starting the sampler if it is not running yet"""
+        self.start()
+        with self.lock:
+            return self.samples[-1]
+
+    def history(self, seconds=None):
+        """Buffered samples, oldest first, optionally only those from the last seconds"""
+        with self.lock:
+            samples = list(self.samples)
+        if seconds is not None:
+            cutoff = time.time() - seconds
+            samples = [s for s in samples if s["time"] >= cutoff]
+        return samples
@@ -0,0 +1,117 @@
+"""
+Filesystem-event driven Obsidian vault sync.
+
+Uses watchdog (inotify on Linux, ReadDirectoryChangesW on Windows, FSEvents
+on macOS) to collect the notes touched by saves, debounces bursts of events
+and re-indexes just those notes. Falls back to the polling loop when
+watchdog is not installed or the observer cannot start.
+"""
+import os
+import threading
+import time
+
+import memory
+from memory import sync_obsidian_memory, SUPPORTED_EXTENSIONS
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+WATCH_DEBOUNCE = 2.0  # seconds of quiet after the last event before re-indexing
+FULL_RESCAN = None  # marker: an event we cannot map to single notes (e.g. a folder move)
+
+
+def background_sync(interval):
+    """Polling fallback: rescan the whole vault every interval seconds"""
+    while True:
+        try:
+            sync_obsidian_memory()
+            time.sleep(interval)
+        except Exception as e:
+            print(f"Background sync error: {e}")
+            time.sleep(60)  # Wait 1 minute before retrying
+
+
+class VaultEventHandler(FileSystemEventHandler):
+    """Collect touched note paths and flush them after a quiet period"""
+
+    def __init__(self, debounce=WATCH_DEBOUNCE):
+        super().__init__()
+        self.debounce = debounce
+        self.pending = set()
+        self.full_rescan = False
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def on_any_event(self, event):
+        if event.event_type in ("opened", "closed_no_write"):
+            return
+        paths = [event.src_path, getattr(event, "dest_path", "")]
+        with self.lock:
+            if event.is_directory:
+                if event.event_type in ("moved", "deleted"):
+                    self.full_rescan = True
+                else:
+                    return
+            else:
+                for path in paths:
+                    if path and any(path.endswith(ext) for ext in SUPPORTED_EXTENSIONS):
+                        self.pending.add(os.fsdecode(path))
+                if not self.pending and not self.full_rescan:
+                    return
+            
+            # Restart the quiet-period timer on every relevant event
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.debounce, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            paths = sorted(self.pending)
+            full_rescan = self.full_rescan
+            self.pending = set()
+            self.full_rescan = False
+            self.timer = None
+        try:
+            if full_rescan:
+                sync_obsidian_memory()
+            elif paths:
+                sync_obsidian_memory(paths)
+        except Exception as e:
+            print(f"Vault watcher sync error: {e}")
+
+
+def start_vault_watcher(debounce=WATCH_DEBOUNCE):
+    """Start watching the vault. Returns the observer, or None if unavailable."""
+    if Observer is None:
+        print("⚠️  watchdog not installed (pip install watchdog) - falling back to polling")
+        return None
+    if not os.path.exists(memory.OBSIDIAN_FOLDER):
+        return None
+    try:
+        observer = Observer()
+        observer.schedule(VaultEventHandler(debounce), memory.OBSIDIAN_FOLDER, recursive=True)
+        observer.daemon = True
+        observer.start()
+        print(f"👀 Watching {memory.OBSIDIAN_FOLDER} for changes")
+        return observer
+    except Exception as e:
+        print(f"⚠️  Could not start vault watcher ({e}) - falling back to polling")
+        return None
+
+
+def start_vault_sync(poll_interval, debounce=WATCH_DEBOUNCE):
+    """Keep memory in sync with the vault: event-driven if possible, else polling.
+
+    Returns "events" or "polling".
+    """
+    if start_vault_watcher(debounce) is not None:
+        return "events"
+    sync_thread = threading.Thread(target=background_sync, args=(poll_interval,), daemon=True)
+    sync_thread.start()
+    return "polling"
@@ -0,0 +1,368 @@
+"""
+Approximate nearest-neighbour search backends for the memory store.
+
+memory.py keeps a brute-force IndexIDMap2 as the primary index; the indexes
+built here are derived search structures over the same ids. Backends:
+
+  flat   - exact brute force (no derived index)
+  hnsw   - graph index, fast and high recall, no training
+  ivfpq  - inverted lists + product quantization, trained on stored vectors
+  auto   - pick by corpus size (see select_backend)
+
+The primary index can store its vectors compressed (see build_storage_index):
+
+  float32 - exact, 4 bytes per dimension
+  float16 - half precision, 2 bytes per dimension, near-lossless
+  int8    - 8-bit scalar quantization, 1 byte per dimension
+  pq      - product quantization, IVFPQ_SUBQUANTIZERS bytes per vector
+
+Lossy storage over-fetches RESCORE_FACTOR candidates per result and rescores
+them against the full-precision vectors kept on disk.
+"""
+import time
+
+import faiss
+import numpy as np
+
+BACKENDS = ("flat", "hnsw", "ivfpq")
+
+# Corpus sizes at which "auto" switches backend
+HNSW_MIN_VECTORS = 50_000
+IVFPQ_MIN_VECTORS = 1_000_000
+
+HNSW_M = 32  # graph neighbours per node
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+
+IVFPQ_SUBQUANTIZERS = 48  # must divide the embedding dimension (384 / 48 = 8 dims per code)
+IVFPQ_BITS = 8
+IVFPQ_NPROBE = 16
+IVFPQ_MAX_TRAIN = 100_000  # vectors sampled for training
+
+STORAGE_TYPES = ("float32", "float16", "int8", "pq")
+RESCORE_FACTOR = 4  # candidates per result rescored at full precision when storage is lossy
+
+
+def select_backend(backend, n_vectors):
+    """Resolve "auto" to a concrete backend for a corpus of n_vectors"""
+    if backend != "auto":
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown index backend {backend!r}, expected one of {BACKENDS} or 'auto'")
+        return backend
+    if n_vectors >= IVFPQ_MIN_VECTORS:
+        return "ivfpq"
+    if n_vectors >= HNSW_MIN_VECTORS:
+        return "hnsw"
+    return "flat"
+
+
+def ivfpq_nlist(n_vectors):
+    """Number of inverted lists for a corpus of n_vectors"""
+    return int(min(65536, max(16, 4 * np.sqrt(n_vectors))))
+
+
+def can_train_ivfpq(n_vectors):
+    """IVF-PQ needs enough vectors to train both the coarse and PQ codebooks"""
+    return n_vectors >= max(2 ** IVFPQ_BITS, ivfpq_nlist(n_vectors)) * 4
+
+
+def build_ann_index(backend, vectors, ids):
+    """Build a derived search index over (vectors, ids).
+
+    Returns None for the flat backend. IVF-PQ is trained on a sample of the
+    given vectors; if there are too few to train, falls back to HNSW.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    ids = np.asarray(ids, dtype="int64")
+    dim = vectors.shape[1]
+
+    if backend == "flat":
+        return None
+
+    if backend == "ivfpq" and not can_train_ivfpq(len(vectors)):
+        print(f"⚠️  Too few vectors ({len(vectors)}) to train IVF-PQ - using HNSW")
+        backend = "hnsw"
+
+    if backend == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        hnsw.hnsw.efSearch = HNSW_EF_SEARCH
+        ann = faiss.IndexIDMap(hnsw)
+    else:
+        nlist = ivfpq_nlist(len(vectors))
+        quantizer = faiss.IndexFlatIP(dim)
+        ann = faiss.IndexIVFPQ(quantizer, dim, nlist, IVFPQ_SUBQUANTIZERS, IVFPQ_BITS, faiss.METRIC_INNER_PRODUCT)
+        if len(vectors) > IVFPQ_MAX_TRAIN:
+            sample = np.random.default_rng(0).choice(len(vectors), IVFPQ_MAX_TRAIN, replace=False)
+            ann.train(vectors[sample])
+        else:
+            ann.train(vectors)
+        ann.nprobe = IVFPQ_NPROBE
+
+    if len(vectors) > 0:
+        ann.add_with_ids(vectors, ids)
+    return ann
+
+
+def training_sample(vectors):
+    """At most IVFPQ_MAX_TRAIN vectors for training a quantizer"""
+    if len(vectors) > IVFPQ_MAX_TRAIN:
+        sample = np.sort(np.random.default_rng(0).choice(len(vectors), IVFPQ_MAX_TRAIN, replace=False))
+        vectors = vectors[sample]
+    return np.ascontiguousarray(vectors, dtype="float32")
+
+
+def can_train_pq(n_vectors):
+    """Product quantization needs ~39 training vectors per codebook centroid"""
+    return n_vectors >= 2 ** IVFPQ_BITS * 39
+
+
+def build_storage_index(storage, dim, train_vectors=None):
+    """Empty brute-force index storing vectors as float32, float16, int8 or PQ codes.
+
+    int8 and PQ are trained on train_vectors. Without enough vectors, PQ
+    falls back to int8, and int8 uses the full [-1, 1] range of unit vectors.
+    """
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"unknown vector storage {storage!r}, expected one of {STORAGE_TYPES}")
+    n_train = 0 if train_vectors is None else len(train_vectors)
+    if storage == "float32":
+        return faiss.IndexFlatIP(dim)
+    if storage == "float16":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+    if storage == "pq":
+        if can_train_pq(n_train):
+            pq = faiss.IndexPQ(dim, IVFPQ_SUBQUANTIZERS, IVFPQ_BITS, faiss.METRIC_INNER_PRODUCT)
+            pq.train(training_sample(train_vectors))
+            return pq
+        if n_train > 0:
+            print(f"⚠️  Too few vectors ({n_train}) to train PQ storage - using int8")
+    sq = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    if n_train > 0:
+        sq.train(training_sample(train_vectors))
+    else:
+        sq.train(np.array([[-1.0] * dim, [1.0] * dim], dtype="float32"))
+    return sq
+
+
+def storage_name(storage_index):
+    """Storage type of an index built by build_storage_index (the id map is looked through)"""
+    if isinstance(storage_index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        storage_index = storage_index.index
+    storage_index = faiss.downcast_index(storage_index)
+    if isinstance(storage_index, faiss.IndexPQ):
+        return "pq"
+    if isinstance(storage_index, faiss.IndexScalarQuantizer):
+        return "float16" if storage_index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "int8"
+    return "float32"
+
+
+def storage_bytes_per_vector(storage_index):
+    return storage_index.sa_code_size()
+
+
+def rescore(query, ids, vectors, top_k):
+    """Reorder candidate ids by exact inner product with their full-precision vectors.
+
+    Returns (scores, ids) of the best top_k, as 1-D arrays.
+    """
+    if len(ids) == 0:
+        return np.zeros(0, dtype="float32"), np.zeros(0, dtype="int64")
+    scores = np.asarray(vectors, dtype="float32") @ np.asarray(query, dtype="float32")
+    order = np.argsort(-scores)[:top_k]
+    return scores[order], np.asarray(ids, dtype="int64")[order]
+
+
+def ann_backend_name(ann):
+    """Backend name of a derived index built by build_ann_index"""
+    if ann is None:
+        return "flat"
+    if isinstance(faiss.downcast_index(ann), faiss.IndexIVFPQ):
+        return "ivfpq"
+    return "hnsw"
+
+
+def supports_remove(ann):
+    """HNSW graphs cannot delete nodes; removed ids are filtered at search time"""
+    return ann is None or ann_backend_name(ann) == "ivfpq"
+
+
+def save_ann_index(ann, filepath):
+    faiss.write_index(ann, filepath)
+
+
+def load_ann_index(filepath):
+    ann = faiss.read_index(filepath)
+    backend = ann_backend_name(ann)
+    if backend == "hnsw":
+        faiss.downcast_index(ann.index).hnsw.efSearch = HNSW_EF_SEARCH
+    elif backend == "ivfpq":
+        faiss.extract_index_ivf(ann).nprobe = IVFPQ_NPROBE
+    return ann
+
+
+def timed_search(search_index, queries, k):
+    """Search queries one at a time. Returns (ids per query, per-query latency in ms)."""
+    latencies = []
+    results = []
+    for query in queries:
+        start_time = time.perf_counter()
+        _, I = search_index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        results.append(I[0])
+    return np.array(results), np.array(latencies)
+
+
+def evaluate_backends(vectors, ids, k=8, n_queries=200, backends=("hnsw", "ivfpq")):
+    """Report recall@k and per-query latency of each backend against exact flat search.
+
+    Queries are a random sample of the stored vectors with a little noise,
+    so they look like real paraphrases rather than exact duplicates.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    ids = np.asarray(ids, dtype="int64")
+    if len(vectors) == 0:
+        return []
+
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)
+    queries = vectors[sample] + rng.normal(0, 0.01, (len(sample), vectors.shape[1])).astype("float32")
+    k = min(k, len(vectors))
+
+    flat = faiss.IndexIDMap(faiss.IndexFlatIP(vectors.shape[1]))
+    flat.add_with_ids(vectors, ids)
+
+    truth, flat_latency = timed_search(flat, queries, k)
+    report = [{
+        "backend": "flat",
+        "recall_at_k": 1.0,
+        "latency_ms_p50": round(float(np.percentile(flat_latency, 50)), 3),
+        "latency_ms_p99": round(float(np.percentile(flat_latency, 99)), 3),
+        "build_sec": 0.0
+    }]
+
+    for backend in backends:
+        start_time = time.perf_counter()
+        ann = build_ann_index(backend, vectors, ids)
+        build_sec = time.perf_counter() - start_time
+        found, latency = timed_search(ann, queries, k)
+        hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+        report.append({
+            "backend": ann_backend_name(ann),
+            "recall_at_k": round(hits / truth.size, 4),
+            "latency_ms_p50": round(float(np.percentile(latency, 50)), 3),
+            "latency_ms_p99": round(float(np.percentile(latency, 99)), 3),
+            "build_sec": round(build_sec, 3)
+        })
+    return report
+
+
+def evaluate_normalization(vectors, k=8, n_queries=200, noise=0.05):
+    """Compare inner-product search over raw vectors with cosine search over normalized ones.
+
+    Queries are noisy copies of stored vectors, so the vector a query was
+    made from is the right answer: self_hit_at_1 and mrr_at_k measure how
+    often each variant ranks it first. overlap_with_cosine is the share of
+    each variant's top-k that the cosine top-k also contains. Norm spread
+    shows how much raw inner product favours high-norm chunks.
+    """
+    raw = np.ascontiguousarray(vectors, dtype="float32")
+    if len(raw) == 0:
+        return {}
+    unit = raw.copy()
+    faiss.normalize_L2(unit)
+    norms = np.linalg.norm(raw, axis=1)
+
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(raw), min(n_queries, len(raw)), replace=False)
+    raw_queries = raw[sample] + rng.normal(0, noise * float(norms.mean()), (len(sample), raw.shape[1])).astype("float32")
+    unit_queries = raw_queries.copy()
+    faiss.normalize_L2(unit_queries)
+    k = min(k, len(raw))
+
+    report = {
+        "vectors": len(raw),
+        "norm_min": round(float(norms.min()), 4),
+        "norm_mean": round(float(norms.mean()), 4),
+        "norm_max": round(float(norms.max()), 4)
+    }
+    results = {}
+    for name, corpus, queries in (("before", raw, raw_queries), ("after", unit, unit_queries)):
+        flat = faiss.IndexFlatIP(raw.shape[1])
+        flat.add(corpus)
+        found, latency = timed_search(flat, queries, k)
+        results[name] = found
+        ranks = [list(row).index(target) + 1 if target in row else None for row, target in zip(found, sample)]
+        report[name] = {
+            "self_hit_at_1": round(sum(rank == 1 for rank in ranks) / len(ranks), 4),
+            "mrr_at_k": round(sum(1.0 / rank for rank in ranks if rank) / len(ranks), 4),
+            "latency_ms_p50": round(float(np.percentile(latency, 50)), 3)
+        }
+    for name in ("before", "after"):
+        hits = sum(len(set(f) & set(t)) for f, t in zip(results[name], results["after"]))
+        report[name]["overlap_with_cosine"] = round(hits / results["after"].size, 4)
+    return report
+
+
+def evaluate_storage(vectors, k=8, n_queries=200, storages=STORAGE_TYPES, rescore_factor=RESCORE_FACTOR):
+    """Report footprint, recall@k (with and without rescoring) and latency of each storage type.
+
+    Recall is measured against exact float32 search with noisy copies of
+    stored vectors as queries. Rescoring fetches k * rescore_factor
+    candidates and reorders them by their full-precision vectors.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    if len(vectors) == 0:
+        return []
+
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)
+    queries = vectors[sample] + rng.normal(0, 0.01, (len(sample), vectors.shape[1])).astype("float32")
+    faiss.normalize_L2(queries)
+    k = min(k, len(vectors))
+
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    truth, _ = timed_search(exact, queries, k)
+
+    report = []
+    for storage in storages:
+        start_time = time.perf_counter()
+        quantized = build_storage_index(storage, vectors.shape[1], vectors)
+        quantized.add(vectors)
+        build_sec = time.perf_counter() - start_time
+        found, _ = timed_search(quantized, queries, k)
+        candidates, latency = timed_search(quantized, queries, min(len(vectors), k * rescore_factor))
+
+        rescored = []
+        for i, (query, ids) in enumerate(zip(queries, candidates)):
+            rescore_start = time.perf_counter()
+            ids = ids[ids >= 0]
+            rescored.append(rescore(query, ids, vectors[ids], k)[1])
+            latency[i] += (time.perf_counter() - rescore_start) * 1000
+        bytes_per_vector = storage_bytes_per_vector(quantized)
+        report.append({
+            "storage": storage_name(quantized),
+            "bytes_per_vector": bytes_per_vector,
+            "index_mb": round(bytes_per_vector * len(vectors) / (1024 * 1024), 2),
+            "recall_at_k": round(sum(len(set(f) & set(t)) for f, t in zip(found, truth)) / truth.size, 4),
+            "recall_at_k_rescored": round(sum(len(set(f) & set(t)) for f, t in zip(rescored, truth)) / truth.size, 4),
+            "latency_ms_p50_rescored": round(float(np.percentile(latency, 50)), 3),
+            "build_sec": round(build_sec, 3)
+        })
+    return report
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+    import memory
+
+    # python vector_index.py [vectors.npy] - with a vector file (e.g. from a
+    # pre-normalization backup), report what normalizing it changes
+    if len(sys.argv) > 1:
+        print(json.dumps(evaluate_normalization(np.load(sys.argv[1], mmap_mode="r")), indent=2))
+    else:
+        memory.load_memory()
+        print(json.dumps(memory.index_report(), indent=2))
+        print(json.dumps(memory.storage_report(), indent=2))